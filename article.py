@@ -1,56 +1,641 @@
+import asyncio
 import datetime
 import logging
+import os
+import functools
+import html
+import json
 import re
+import time
+from typing import Callable, Iterable, Iterator
 
-import httpx
-from bs4 import BeautifulSoup
-from markdown2 import markdown
-from telegraph.aio import Telegraph
+from article_cache import article_cache
+from config import (
+    TELEGRAPH_TOKEN_PATH,
+    TELEGRAPH_ACCESS_TOKENS,
+    TELEGRAPH_ACCOUNT_POOL_SIZE,
+    TELEGRAPH_PAGE_BYTES,
+    TELEGRAPH_PAGE_CONCURRENCY,
+    JINA_CACHE_TTL,
+    JINA_MAX_BYTES,
+)
+from http_clients import get_client
+from metrics import timed
+from offload import run_blocking
 
-client = httpx.AsyncClient(timeout=600)
+# the Telegraph API, called over the pooled telegraph client
+TELEGRAPH_API_URL = "https://api.telegra.ph"
+# Telegraph accepts titles of up to 256 characters
+TELEGRAPH_TITLE_LIMIT = 256
+# createPage calls retried after a flood wait
+TELEGRAPH_MAX_RETRIES = 3
+# r.jina.ai starts its markdown with "Title: ..." and "URL Source: ..." lines
+JINA_TITLE = re.compile(r"^Title:[ \t]*(.+)$", re.MULTILINE)
+
+
+class TelegraphPublisher:
+    """
+    Long-lived Telegraph publisher that reuses its accounts, so publishing a
+    page costs a single createPage request, made over the pooled client.
+
+    Access tokens come from TELEGRAPH_ACCESS_TOKENS and the token file; missing
+    accounts are created once and their tokens persisted to that file. Pages
+    are spread over the accounts round-robin.
+    """
+
+    def __init__(self, token_path: str, access_tokens: list[str], pool_size: int):
+        self.token_path = token_path
+        self.pool_size = max(pool_size, len(access_tokens), 1)
+        self._access_tokens = access_tokens
+        self._accounts: list[str] = []
+        self._next = 0
+        self._lock = asyncio.Lock()
+
+    def _load_tokens(self) -> list[str]:
+        # the configured tokens first, then those of accounts created earlier
+        tokens = list(self._access_tokens)
+        if os.path.exists(self.token_path):
+            with open(self.token_path, encoding="utf-8") as f:
+                tokens.extend(line.strip() for line in f if line.strip())
+        return list(dict.fromkeys(tokens))
+
+    @staticmethod
+    async def _call(method: str, values: dict) -> dict:
+        """
+        Calls a method of the Telegraph API.
+
+        Raises:
+            RetryAfterError: On flood control, with the seconds to wait.
+            TelegraphException: On any other error reported by Telegraph.
+        """
+        from telegraph.exceptions import RetryAfterError, TelegraphException
+
+        response = await get_client("telegraph").post(
+            f"{TELEGRAPH_API_URL}/{method}", data=values
+        )
+        response.raise_for_status()
+        body = response.json()
+        if body.get("ok"):
+            return body["result"]
+        error = body.get("error")
+        if isinstance(error, str) and error.startswith("FLOOD_WAIT_"):
+            raise RetryAfterError(int(error.rsplit("_", 1)[-1]))
+        raise TelegraphException(error)
+
+    async def ensure_accounts(self) -> None:
+        """Loads or creates the accounts, done once before the first page."""
+        async with self._lock:
+            if self._accounts:
+                return
+            tokens = self._load_tokens()
+            created = []
+            while len(tokens) + len(created) < self.pool_size:
+                account = await self._call("createAccount", {"short_name": "anonymous"})
+                logging.info(account)
+                created.append(account["access_token"])
+            if created:
+                # only the created tokens, the configured ones stay out of the file
+                with open(self.token_path, "a", encoding="utf-8") as f:
+                    f.writelines(f"{token}\n" for token in created)
+            self._accounts = tokens + created
+
+    @timed("telegraph", "publish")
+    async def publish(self, title: str, html: str) -> str:
+        """
+        Creates a Telegraph page.
+
+        Parameters:
+            title (str): The page title.
+            html (str): The page content.
+
+        Returns:
+            str: The page URL.
+        """
+        from telegraph.exceptions import RetryAfterError
+        from telegraph.utils import html_to_nodes
+
+        await self.ensure_accounts()
+        access_token = self._accounts[self._next % len(self._accounts)]
+        self._next += 1
+        content = json.dumps(
+            html_to_nodes(html), ensure_ascii=False, separators=(",", ":")
+        )
+        values = {"access_token": access_token, "title": title, "content": content}
+        for attempt in range(TELEGRAPH_MAX_RETRIES + 1):
+            try:
+                response = await self._call("createPage", values)
+                break
+            except RetryAfterError as e:
+                # flood control, wait as long as Telegraph asks for
+                if attempt == TELEGRAPH_MAX_RETRIES:
+                    raise
+                logging.warning(f"telegraph {attempt=}: {e}")
+                await asyncio.sleep(e.retry_after)
+        logging.info(response)
+        return response["url"]
+
+
+telegraph_publisher = TelegraphPublisher(
+    TELEGRAPH_TOKEN_PATH,
+    [token for token in TELEGRAPH_ACCESS_TOKENS.split(",") if token],
+    TELEGRAPH_ACCOUNT_POOL_SIZE,
+)
 
 
 async def write_to_telegraph(html: str) -> str:
-    telegraph = Telegraph()
-    if not telegraph.get_access_token():
-        logging.info(await telegraph.create_account(short_name="anonymous"))
+    return await telegraph_publisher.publish(
+        f"article {datetime.datetime.now(datetime.UTC)}", html
+    )
+
+
+# headings of the word explanations that the essay prompt asks for
+EXPLANATION_HEADING = re.compile(
+    r"explanation|vocabulary|glossary|word list|词汇|解释", re.IGNORECASE
+)
+FENCE = re.compile(r"^\s*(`{3,}|~{3,})")
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)[\s#]*$")
+# a line in bold only, e.g. **Explanation of the words:**, counts as a heading
+BOLD_HEADING = re.compile(r"^(?:\*\*|__)([^*_]+)(?:\*\*|__):?$")
+# thematic breaks and setext heading underlines
+RULE = re.compile(r"^(?:[-*_=]\s*){3,}$")
+LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s+)?")
+TABLE_DELIMITER = re.compile(r"^\|?[\s:|-]+\|[\s:|-]*$")
+INLINE = [
+    (re.compile(r"`+[^`]*`+"), " "),
+    (re.compile(r"!\[[^\]]*\]\([^)]*\)"), " "),
+    (re.compile(r"\[\^[^\]]*\]"), ""),
+    (re.compile(r"\[([^\]]*)\](?:\([^)]*\)|\[[^\]]*\])"), r"\1"),
+    (re.compile(r"<?(?:https?://|www\.)[^\s>]*[^\s>.,;:!?)]>?"), " "),
+    (re.compile(r"<br\s*/?>", re.IGNORECASE), " "),
+    (re.compile(r"</?[a-zA-Z][^>]*>"), ""),
+    (re.compile(r"\*+|~~|(?<!\w)_+|_+(?!\w)"), ""),
+    # regional indicator pairs are flags, read out as letters otherwise
+    (re.compile("[\U0001f1e6-\U0001f1ff]"), ""),
+    (re.compile(r"\\([\\`*_{}\[\]()#+\-.!|>~])"), r"\1"),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r" (?=[,.;:!?])"), ""),
+]
+SENTENCE = re.compile(r".+?(?:[.!?]+[\"'”’)]*(?=\s|$)|[。！？]+[”’）]*|$)")
+# a full stop after these does not end the sentence
+ABBREVIATION = re.compile(
+    r"\b(?:e\.g|i\.e|etc|vs|Mr|Mrs|Ms|Dr|Prof|St|adj|adv|n|v|prep|conj|[A-Z])\.$"
+)
+
+
+def _speakable(markdown_line: str) -> str:
+    text = html.unescape(markdown_line)
+    for pattern, replacement in INLINE:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def _sentences(text: str) -> list[str]:
+    """Splits text into sentences, ending a bare heading or item with a full stop."""
+    if text and text[-1].isalnum():
+        text += "."
+    sentences = []
+    for match in SENTENCE.finditer(text):
+        sentence = match.group().strip()
+        if not sentence:
+            continue
+        if sentences and ABBREVIATION.search(sentences[-1]):
+            sentences[-1] += " " + sentence
+        else:
+            sentences.append(sentence)
+    return sentences
+
+
+def iter_speech_paragraphs(
+    lines: Iterable[str], include_explanation: bool = True
+) -> Iterator[list[str]]:
+    """
+    Converts markdown to speakable text in a single pass over its lines.
+
+    Code blocks, inline code, images, URLs and flag emoji are dropped, links
+    and emphasis keep their text, and headings, list items and table rows
+    become sentences of their own.
+
+    Parameters:
+        lines (Iterable[str]): The markdown lines.
+        include_explanation (bool): Whether to keep the section under a heading
+            like "Explanation" or "Vocabulary", up to the next heading of the
+            same or a higher level.
+
+    Returns:
+        Iterator[list[str]]: The sentences of each paragraph.
+    """
+    paragraph: list[str] = []
+    fence = None
+    skipped_level = None
+    in_list = False
+    for line in lines:
+        stripped = line.strip()
+        if fence is not None:
+            if stripped.startswith(fence):
+                fence = None
+            continue
+        if match := FENCE.match(line):
+            fence = match.group(1)
+            continue
+
+        title = None
+        if heading := HEADING.match(stripped):
+            level, title = len(heading.group(1)), heading.group(2)
+        elif heading := BOLD_HEADING.match(stripped):
+            level, title = 7, heading.group(1)
+        if title is not None:
+            if skipped_level is not None and level <= skipped_level:
+                skipped_level = None
+            if not include_explanation and EXPLANATION_HEADING.search(title):
+                skipped_level = skipped_level or level
+        if skipped_level is not None:
+            continue
+
+        if paragraph and (
+            title is not None
+            or not stripped
+            or RULE.match(stripped)
+            or LIST_ITEM.match(line)
+            or stripped.startswith("|")
+        ):
+            if sentences := _sentences(_speakable(" ".join(paragraph))):
+                yield sentences
+            paragraph = []
+        if title is not None:
+            if sentences := _sentences(_speakable(title)):
+                yield sentences
+        elif not stripped or RULE.match(stripped) or TABLE_DELIMITER.match(stripped):
+            continue
+        elif stripped.startswith("|"):
+            cells = [_speakable(cell) for cell in stripped.strip("|").split("|")]
+            if sentences := _sentences(", ".join(c for c in cells if c)):
+                yield sentences
+        elif match := LIST_ITEM.match(line):
+            in_list = True
+            paragraph = [line[match.end() :]]
+        elif line.startswith(("    ", "\t")) and not paragraph and not in_list:
+            # an indented code block
+            continue
+        else:
+            in_list = in_list and line.startswith((" ", "\t"))
+            paragraph.append(stripped.lstrip("> "))
+    if paragraph and (sentences := _sentences(_speakable(" ".join(paragraph)))):
+        yield sentences
+
+
+def markdown_to_speech(markdown_string: str, include_explanation: bool = True) -> str:
+    """
+    Converts markdown to the text read out by TTS, one sentence per line and
+    paragraphs separated by a blank line.
+    """
+    paragraphs = iter_speech_paragraphs(
+        markdown_string.splitlines(), include_explanation
+    )
+    return "\n\n".join("\n".join(sentences) for sentences in paragraphs)
+
+
+async def amarkdown_to_speech(
+    markdown_string: str, include_explanation: bool = True
+) -> str:
+    """Converts markdown to the text read out by TTS in the offload pool"""
+    return await run_blocking(markdown_to_speech, markdown_string, include_explanation)
+
+
+# Telegraph rejects a page with any other tag, e.g. NotAllowedTag: 'h1'
+TELEGRAPH_TAGS = frozenset(
+    ["a", "aside", "b", "blockquote", "br", "code", "em", "figcaption", "figure"]
+    + ["h3", "h4", "hr", "i", "iframe", "img", "li", "ol", "p", "pre", "s"]
+    + ["strong", "u", "ul", "video"]
+)
+HTML_TAG = re.compile(r"</?([a-zA-Z][\w-]*)[^>]*>")
+
+
+# built once, the renderer keeps no state between calls
+@functools.cache
+def get_markdown_renderer():
+    import mistune
+
+    class TelegraphRenderer(mistune.HTMLRenderer):
+        """
+        Renders only the tags Telegraph accepts. Its methods take precedence
+        over those the plugins register.
+        """
+
+        def heading(self, text: str, level: int, **attrs) -> str:
+            # Telegraph only has h3 and h4
+            tag = "h3" if level <= 3 else "h4"
+            return f"<{tag}>{text}</{tag}>\n"
+
+        def block_html(self, html_string: str) -> str:
+            return self.inline_html(html_string)
+
+        def inline_html(self, html_string: str) -> str:
+            # raw HTML keeps only the allowed tags
+            return HTML_TAG.sub(
+                lambda m: m.group(0) if m.group(1).lower() in TELEGRAPH_TAGS else "",
+                html_string,
+            )
 
-    response = await telegraph.create_page(
-        f"article {datetime.datetime.now(datetime.UTC)}",
-        html_content=html,
+        def strikethrough(self, text: str) -> str:
+            return f"<s>{text}</s>"
+
+        def footnote_ref(self, key: str, index: int) -> str:
+            return f"[{index}]"
+
+        def footnotes(self, text: str) -> str:
+            return f"<hr />\n<ol>\n{text}</ol>\n"
+
+        def footnote_item(self, text: str, key: str, index: int) -> str:
+            return f"<li>{text}</li>\n"
+
+        # a table becomes a preformatted block of rows with the cells between pipes
+        def table(self, text: str) -> str:
+            return f"<pre>{text}</pre>\n"
+
+        def table_head(self, text: str) -> str:
+            return f"{text}|\n"
+
+        def table_body(self, text: str) -> str:
+            return text
+
+        def table_row(self, text: str) -> str:
+            return f"{text}|\n"
+
+        def table_cell(
+            self, text: str, align: str | None = None, head: bool = False
+        ) -> str:
+            return f"| <b>{text}</b> " if head else f"| {text} "
+
+    return mistune.create_markdown(
+        renderer=TelegraphRenderer(escape=False),
+        hard_wrap=True,
+        plugins=["strikethrough", "footnotes", "table", "speedup"],
     )
-    logging.info(response)
-    return response["url"]
 
 
-def markdown_to_text(markdown_string):
-    """Converts a markdown string to plaintext"""
+def markdown_to_html(markdown_string: str) -> str:
+    """Renders a markdown string to HTML for a Telegraph page"""
+    return get_markdown_renderer()(markdown_string)
+
+
+def _markdown_blocks(markdown_string: str) -> list[str]:
+    """Splits markdown at the blank lines outside of fenced code blocks."""
+    blocks, block, fence = [], [], None
+    for line in markdown_string.splitlines():
+        if fence is None and not line.strip():
+            if block:
+                blocks.append("\n".join(block))
+                block = []
+            continue
+        if match := FENCE.match(line):
+            if fence is None:
+                fence = match.group(1)
+            elif line.strip().startswith(fence):
+                fence = None
+        block.append(line)
+    if block:
+        blocks.append("\n".join(block))
+    return blocks
+
+
+# where a line too long for a page is split, preferably after a sentence
+SENTENCE_END = re.compile(r"[.!?。！？][\"'”’)）]*\s*")
+
+
+def _split_line(line: str, limit: int) -> list[str]:
+    """Splits a line above `limit` bytes after sentences or at spaces."""
+    pieces = []
+    while len(line.encode()) > limit:
+        head = line.encode()[:limit].decode(errors="ignore")
+        ends = [m.end() for m in SENTENCE_END.finditer(head) if m.end() < len(head)]
+        cut = ends[-1] if ends and 2 * ends[-1] > len(head) else head.rfind(" ") + 1
+        # a line without any usable break is cut at the limit
+        cut = cut if 2 * cut > len(head) else len(head)
+        pieces.append(line[:cut].rstrip())
+        line = line[cut:].lstrip()
+    pieces.append(line)
+    return pieces
+
+
+def _split_block(block: str, limit: int, html_size: int) -> list[str]:
+    """
+    Splits a block rendering to `html_size` bytes, above `limit`, by lines,
+    and a line too long by itself after sentences or at spaces. Code is
+    re-fenced and the header of a table repeated in every piece.
+    """
+    lines = block.splitlines()
+    fence = FENCE.match(lines[0])
+    header = []
+    if fence:
+        opener, closer = lines[0], fence.group(1)
+        lines = lines[1:-1] if lines[-1].strip().startswith(closer) else lines[1:]
+        header_size = len(opener) + len(closer) + 2
+    else:
+        if len(lines) > 2 and "|" in lines[0] and TABLE_DELIMITER.match(lines[1]):
+            header, lines = lines[:2], lines[2:]
+        header_size = len("\n".join(header).encode()) + 1
+    # the markdown of a piece is sized by how much the block grows as HTML
+    budget = int(0.9 * limit * len(block.encode()) / html_size) - header_size
+    budget = max(budget, 64)
+    pieces, piece, size = [], [], 0
+    for line in lines:
+        if piece and size + len(line.encode()) > budget:
+            pieces.append(piece)
+            piece, size = [], 0
+        *full, line = _split_line(line, budget)
+        pieces.extend([part] for part in full)
+        piece.append(line)
+        size += len(line.encode()) + 1
+    pieces.append(piece)
+    parts = []
+    for piece in pieces:
+        piece = [opener, *piece, closer] if fence else header + piece
+        piece_markdown = "\n".join(piece)
+        part = markdown_to_html(piece_markdown)
+        part_size = len(part.encode())
+        # a piece growing more than the block as a whole is split again
+        if part_size > limit and len(piece_markdown) < len(block):
+            parts.extend(_split_block(piece_markdown, limit, part_size))
+        else:
+            parts.append(part)
+    return parts
+
+
+def split_html_pages(markdown_string: str, limit: int) -> list[str]:
+    """
+    Renders markdown to the HTML of as few Telegraph pages as possible, each
+    below `limit` bytes, breaking between blocks.
+
+    Parameters:
+        markdown_string (str): The markdown to render.
+        limit (int): The maximum HTML bytes of a page.
+
+    Returns:
+        list[str]: The HTML of each page.
+    """
+    page_html = markdown_to_html(markdown_string)
+    if len(page_html.encode()) <= limit:
+        return [page_html]
+    pages, page, size = [], [], 0
+    for block in _markdown_blocks(markdown_string):
+        block_html = markdown_to_html(block)
+        parts = (
+            _split_block(block, limit, len(block_html.encode()))
+            if len(block_html.encode()) > limit
+            else [block_html]
+        )
+        for part in parts:
+            part_size = len(part.encode())
+            if page and size + part_size > limit:
+                pages.append("".join(page))
+                page, size = [], 0
+            page.append(part)
+            size += part_size
+    if page:
+        pages.append("".join(page))
+    return pages
+
 
-    # md -> html -> text since BeautifulSoup can extract text cleanly
-    html = markdown(markdown_string)
+async def publish_pages(markdown_string: str, title: str | None = None) -> str:
+    """
+    Publishes markdown to Telegraph. Content above TELEGRAPH_PAGE_BYTES is
+    split into several pages, created concurrently and linked from an index
+    page.
 
-    # remove code snippets
-    html = re.sub(r"<pre>(.*?)</pre>", " ", html)
-    html = re.sub(r"<code>(.*?)</code >", " ", html)
+    Parameters:
+        markdown_string (str): The content.
+        title (str): The page title, the current time by default.
 
-    # extract text
-    soup = BeautifulSoup(html, "html.parser")
-    text = "".join(soup.findAll(text=True))
+    Returns:
+        str: The URL of the page, or of the index page.
+    """
+    title = title or f"article {datetime.datetime.now(datetime.UTC)}"
+    title = title[:TELEGRAPH_TITLE_LIMIT]
+    pages = await run_blocking(split_html_pages, markdown_string, TELEGRAPH_PAGE_BYTES)
+    if len(pages) == 1:
+        return await telegraph_publisher.publish(title, pages[0])
 
-    return text
+    semaphore = asyncio.Semaphore(TELEGRAPH_PAGE_CONCURRENCY)
 
+    async def publish(i: int, page_html: str) -> str:
+        async with semaphore:
+            return await telegraph_publisher.publish(
+                f"{title[: TELEGRAPH_TITLE_LIMIT - 12]} ({i}/{len(pages)})", page_html
+            )
 
-async def fetch_markdown_from_url(source_url: str) -> str:
+    urls = await asyncio.gather(
+        *(publish(i, page_html) for i, page_html in enumerate(pages, 1))
+    )
+    links = "".join(
+        f'<li><a href="{url}">Part {i}</a></li>' for i, url in enumerate(urls, 1)
+    )
+    logging.info(f"published {len(pages)} pages of {title}")
+    return await telegraph_publisher.publish(title, f"<ol>{links}</ol>")
+
+
+@timed("jina", "fetch")
+async def fetch_markdown_from_url(
+    source_url: str,
+    etag: str | None = None,
+    last_modified: str | None = None,
+    max_bytes: int = JINA_MAX_BYTES,
+) -> tuple[str | None, str | None, str | None]:
     """
     Fetch markdown content asynchronously from a given URL.
 
     Parameters:
     - source_url (str): The URL to get the markdown for.
+    - etag (str): The ETag of a cached copy, sent as If-None-Match.
+    - last_modified (str): The Last-Modified of a cached copy, sent as If-Modified-Since.
+    - max_bytes (int): The download is aborted beyond this size.
 
     Returns:
-    - str: The fetched markdown content.
+    - tuple: The fetched markdown content, None when the cached copy is still
+      current, and the ETag and Last-Modified of the response.
     """
     r_jina_url = f"https://r.jina.ai/{source_url}"
-    response = await client.get(r_jina_url)
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    async with get_client("jina").stream(
+        "GET", r_jina_url, headers=headers
+    ) as response:
+        if response.status_code == 304:
+            return None, etag, last_modified
+        response.raise_for_status()
+        if int(response.headers.get("content-length") or 0) > max_bytes:
+            raise ValueError(f"{source_url} is larger than {max_bytes} bytes")
+        content = bytearray()
+        async for chunk in response.aiter_bytes():
+            content.extend(chunk)
+            if len(content) > max_bytes:
+                raise ValueError(f"{source_url} is larger than {max_bytes} bytes")
+        text = content.decode(response.encoding or "utf-8", errors="replace")
+        return text, response.headers.get("etag"), response.headers.get("last-modified")
+
+
+def article_title(markdown_string: str, source_url: str) -> str:
+    """Returns the title r.jina.ai puts in front of the content, or the URL."""
+    match = JINA_TITLE.search(markdown_string, 0, 2000)
+    return match.group(1).strip() if match else source_url
+
+
+async def publish_article(
+    source_url: str, fallback: Callable[[str], str] | None = None
+) -> str:
+    """
+    Publishes an article fetched through r.jina.ai to Telegraph.
+
+    The page of a cached article is returned without any request for
+    JINA_CACHE_TTL seconds. After that the article is revalidated, and only a
+    changed article is published again.
+
+    Parameters:
+        source_url (str): The URL of the article.
+        fallback (Callable): Converts the markdown for a second attempt when
+            publishing it fails.
+
+    Returns:
+        str: The Telegraph URL of the article.
+    """
+    cached = (
+        await asyncio.to_thread(article_cache.get, source_url)
+        if article_cache
+        else None
+    )
+    if cached:
+        markdown_string, etag, last_modified, page_url, checked_at = cached
+        if page_url and time.time() - checked_at < JINA_CACHE_TTL:
+            return page_url
+    else:
+        markdown_string = etag = last_modified = page_url = None
+
+    content, new_etag, new_last_modified = await fetch_markdown_from_url(
+        source_url, etag, last_modified
+    )
+    if page_url and content in (None, markdown_string):
+        logging.info(f"{source_url} unchanged, reusing {page_url}")
+        await asyncio.to_thread(article_cache.touch, source_url)
+        return page_url
+    content = markdown_string if content is None else content
 
-    return response.text
+    title = article_title(content, source_url)
+    try:
+        page_url = await publish_pages(content, title)
+    except Exception as e:
+        if fallback is None:
+            raise
+        logging.exception(f"publishing {source_url} failed, converting it: {e}")
+        page_url = await publish_pages(fallback(content), title)
+    if article_cache:
+        await asyncio.to_thread(
+            article_cache.put,
+            source_url,
+            content,
+            new_etag,
+            new_last_modified,
+            page_url,
+        )
+    return page_url
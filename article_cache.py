@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+import time
+
+from config import JINA_CACHE_PATH, JINA_CACHE_MAX_ENTRIES
+
+
+class ArticleCache:
+    """
+    Cache of articles fetched through r.jina.ai backed by SQLite.
+
+    Entries are keyed by the source URL and keep the markdown, the validators
+    (ETag, Last-Modified) to revalidate it with and the Telegraph page it was
+    published to. The least recently checked entries are evicted once the
+    cache holds more than `max_entries` articles.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS articles (
+                    url TEXT PRIMARY KEY,
+                    markdown TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    page_url TEXT,
+                    checked_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS articles_checked_at "
+                "ON articles (checked_at)"
+            )
+
+    def get(self, url: str) -> tuple | None:
+        """
+        Looks up a cached article.
+
+        Parameters:
+            url (str): The source URL.
+
+        Returns:
+            tuple: The markdown, ETag, Last-Modified, page URL and the time it
+                was last fetched or revalidated, None when unknown.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT markdown, etag, last_modified, page_url, checked_at "
+                "FROM articles WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return row
+
+    def put(
+        self,
+        url: str,
+        markdown: str,
+        etag: str | None,
+        last_modified: str | None,
+        page_url: str,
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO articles "
+                "(url, markdown, etag, last_modified, page_url, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, markdown, etag, last_modified, page_url, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM articles WHERE url IN ("
+                "SELECT url FROM articles ORDER BY checked_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def touch(self, url: str) -> None:
+        """Marks an article as revalidated now."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE articles SET checked_at = ? WHERE url = ?", (time.time(), url)
+            )
+
+
+article_cache = (
+    ArticleCache(JINA_CACHE_PATH, JINA_CACHE_MAX_ENTRIES) if JINA_CACHE_PATH else None
+)
@@ -0,0 +1,51 @@
+import datetime
+import json
+import os
+import platform
+import subprocess
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=project_dir,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_report(results: dict, output: str | None, prefix: str = "") -> dict:
+    """
+    Writes benchmark results with the commit and platform they were taken on.
+
+    Parameters:
+        results (dict): The results keyed by benchmark name.
+        output (str | None): The JSON file, benchmarks/results/<prefix><commit>.json
+            when None.
+        prefix (str): The file name prefix of the default output.
+
+    Returns:
+        dict: The written report.
+    """
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    output = output or os.path.join(
+        project_dir, "benchmarks", "results", f"{prefix}{commit}.json"
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {output}")
+    return report
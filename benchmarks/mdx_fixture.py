@@ -0,0 +1,134 @@
+import random
+import struct
+import zlib
+
+# headwords per key block and per record block
+BLOCK_ENTRIES = 64
+
+_HEADER = (
+    '<Dictionary GeneratedByEngineVersion="2.0" RequiredEngineVersion="2.0" '
+    'Encrypted="No" Encoding="UTF-8" Format="Html" Stripkey="Yes" '
+    'KeyCaseSensitive="No" Compact="Yes" Compat="Yes" Left2Right="Yes" '
+    'DataSourceFormat="106" StyleSheet="" Title="{title}" '
+    'Description="Generated benchmark fixture"/>\r\n\x00'
+)
+
+
+def _block(data: bytes) -> bytes:
+    """Wraps a zlib-compressed block with its type and the adler32 of the data."""
+    return (
+        b"\x02\x00\x00\x00"
+        + struct.pack(">I", zlib.adler32(data))
+        + zlib.compress(data)
+    )
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def write_mdx(path: str, entries: dict[str, str], title: str = "Benchmark") -> None:
+    """
+    Writes a minimal unencrypted MDict 2.0 .mdx file with UTF-8 HTML records.
+
+    Parameters:
+        path (str): The .mdx file to write.
+        entries (dict): HTML definitions keyed by headword.
+        title (str): The dictionary title stored in the header.
+    """
+    headwords = sorted(entries, key=str.lower)
+
+    records = []
+    key_entries = []
+    offset = 0
+    for headword in headwords:
+        record = f"{entries[headword]}\r\n\x00".encode("utf-8")
+        key_entries.append((headword.encode("utf-8"), offset))
+        records.append(record)
+        offset += len(record)
+
+    key_blocks = []
+    key_block_info = b""
+    for chunk in _chunks(key_entries, BLOCK_ENTRIES):
+        data = b"".join(struct.pack(">Q", o) + k + b"\x00" for k, o in chunk)
+        block = _block(data)
+        head, tail = chunk[0][0], chunk[-1][0]
+        key_block_info += (
+            struct.pack(">QH", len(chunk), len(head))
+            + head
+            + b"\x00"
+            + struct.pack(">H", len(tail))
+            + tail
+            + b"\x00"
+            + struct.pack(">QQ", len(block), len(data))
+        )
+        key_blocks.append(block)
+    key_block_info_block = _block(key_block_info)
+    key_header = struct.pack(
+        ">5Q",
+        len(key_blocks),
+        len(key_entries),
+        len(key_block_info),
+        len(key_block_info_block),
+        sum(map(len, key_blocks)),
+    )
+
+    record_blocks = []
+    record_block_info = b""
+    for chunk in _chunks(records, BLOCK_ENTRIES):
+        data = b"".join(chunk)
+        block = _block(data)
+        record_block_info += struct.pack(">QQ", len(block), len(data))
+        record_blocks.append(block)
+    record_header = struct.pack(
+        ">4Q",
+        len(record_blocks),
+        len(records),
+        len(record_block_info),
+        sum(map(len, record_blocks)),
+    )
+
+    header = _HEADER.format(title=title).encode("utf-16-le")
+    with open(path, "wb") as f:
+        f.write(struct.pack(">I", len(header)) + header)
+        f.write(struct.pack("<I", zlib.adler32(header)))
+        f.write(key_header + struct.pack(">I", zlib.adler32(key_header)))
+        f.write(key_block_info_block)
+        f.writelines(key_blocks)
+        f.write(record_header + record_block_info)
+        f.writelines(record_blocks)
+
+
+def generate_entries(count: int, seed: int = 0) -> dict[str, str]:
+    """
+    Generates made-up headwords with Merriam-Webster-like HTML definitions.
+
+    Parameters:
+        count (int): The number of headwords.
+        seed (int): The random seed, the same seed gives the same entries.
+
+    Returns:
+        dict: HTML definitions keyed by headword.
+    """
+    rng = random.Random(seed)
+
+    def word() -> str:
+        return "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(3, 12)))
+
+    def phrase(n: int) -> str:
+        return " ".join(word() for _ in range(n))
+
+    entries = {}
+    while len(entries) < count:
+        headword = word()
+        senses = "".join(
+            f'<div class="sense"><b>{i}</b> <span class="dt">: {phrase(12)}</span>'
+            f'<span class="vi">// {phrase(6)} {headword} {phrase(4)}</span></div>'
+            for i in range(1, rng.randint(2, 5))
+        )
+        entries[headword] = (
+            f'<div class="entry"><h2 class="hw">{headword}</h2>'
+            f'<span class="fl">{rng.choice(["noun", "verb", "adjective"])}</span>'
+            f"{senses}</div>"
+        )
+    return entries
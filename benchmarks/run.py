@@ -0,0 +1,310 @@
+"""
+Offline micro-benchmarks of the bot's hot functions.
+
+    python benchmarks/run.py [--filter NAME] [--output FILE] [--compare FILE]
+
+Results are written as JSON to benchmarks/results/<commit>.json by default;
+`--compare` prints the change of every benchmark against an earlier result.
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import timeit
+from typing import Callable
+
+from common import project_dir, write_report
+
+sys.path.insert(0, project_dir)
+
+# the bot modules read their settings at import time, keep them offline
+os.environ.setdefault("OAI_API_KEY", "benchmark")
+os.environ.setdefault("LLM_CACHE_PATH", "")
+os.environ.setdefault("TTS_CACHE_PATH", "")
+os.environ.setdefault("JINA_CACHE_PATH", "")
+
+import telegramify_markdown  # noqa: E402
+
+import mdict  # noqa: E402
+from article import markdown_to_speech  # noqa: E402
+from baseline import markdown_to_text  # noqa: E402
+from eudic import format_words  # noqa: E402
+from main import (  # noqa: E402
+    gen_word_links,
+    get_random_subarray_weighted,
+    render_link_block,
+    render_word_card,
+)
+from message_pack import MessagePacker  # noqa: E402
+from mdx_fixture import generate_entries, write_mdx  # noqa: E402
+
+# main.py logs at DEBUG, which would interleave with the results
+logging.getLogger().setLevel(logging.WARNING)
+
+SEED = 20240101
+MDX_ENTRIES = 2000
+REPEAT = 5
+
+ESSAY = """
+# The {word} of Quiet Mornings
+
+Every morning begins with a **{word}**, a small ritual that feels *{word}*
+long before the city wakes. [Read more](https://example.com/{word})
+
+- a cup of tea, brewed slowly
+- a page of `notes` from yesterday
+- a window that looks over the river
+
+> Habits are the compound interest of self-improvement.
+
+```python
+print("{word}")
+```
+
+1. First, the kettle.
+2. Then, the words.
+"""
+
+
+def measure(func: Callable[[], object], repeat: int = REPEAT) -> dict:
+    """
+    Times a function, calibrating the number of calls per run like `timeit`.
+
+    Returns:
+        dict: The best and median seconds per call and the run sizes.
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    runs = sorted(t / number for t in timer.repeat(repeat=repeat, number=number))
+    return {
+        "best": runs[0],
+        "median": runs[len(runs) // 2],
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def make_words(count: int) -> list[dict]:
+    rng = random.Random(SEED)
+    return [
+        {"word": f"word{i}", "exp": f"n. meaning {i}<br>v. {rng.random():.6f}"}
+        for i in range(count)
+    ]
+
+
+def benchmarks(*names: str, requires: str | None = None) -> Callable:
+    """
+    Declares the benchmark names a group builds, so run() only builds the
+    groups that --filter selects, and the optional module it needs.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        func.names = names
+        func.requires = requires
+        return func
+
+    return decorator
+
+
+SUBARRAY_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+@benchmarks(*(f"get_random_subarray_weighted[{size}]" for size in SUBARRAY_SIZES))
+def bench_subarray() -> dict[str, Callable]:
+    benches = {}
+    for size in SUBARRAY_SIZES:
+        words = [w["word"] for w in make_words(size)]
+        benches[f"get_random_subarray_weighted[{size}]"] = (
+            lambda words=words: get_random_subarray_weighted(words, 15)
+        )
+    return benches
+
+
+@benchmarks("gen_word_links", "gen_word_links+telegramify")
+def bench_word_links() -> dict[str, Callable]:
+    w = {"word": "vigorous", "exp": "adj. 精力充沛的<br>有力的"}
+    definition = generate_entries(1, SEED).popitem()[1]
+    definition = mdict.html_to_text(definition)
+
+    def render():
+        l = gen_word_links(1, w, w["word"], definition)
+        return telegramify_markdown.markdownify(l)
+
+    return {
+        "gen_word_links": lambda: gen_word_links(1, w, w["word"], definition),
+        "gen_word_links+telegramify": render,
+    }
+
+
+@benchmarks(
+    "render_link_block[cold]",
+    "render_link_block[cached]",
+    "render_word_card",
+    "MessagePacker[15 cards]",
+)
+def bench_word_cards() -> dict[str, Callable]:
+    entries = generate_entries(15, SEED)
+    explanation = ESSAY.format(word="vigorous")
+    definition = mdict.html_to_text(next(iter(entries.values())))
+    cards = [
+        (word, render_word_card(i, {}, word, mdict.html_to_text(html), explanation))
+        for i, (word, html) in enumerate(entries.items(), 1)
+    ]
+
+    def cold_links():
+        render_link_block.cache_clear()
+        return render_link_block("vigorous")
+
+    def pack():
+        packer = MessagePacker()
+        messages = [m for word, text in cards for m in packer.add(text, word)]
+        return messages + packer.flush()
+
+    return {
+        "render_link_block[cold]": cold_links,
+        "render_link_block[cached]": lambda: render_link_block("vigorous"),
+        "render_word_card": lambda: render_word_card(
+            1, {}, "vigorous", definition, explanation
+        ),
+        "MessagePacker[15 cards]": pack,
+    }
+
+
+@benchmarks(
+    "markdown_to_text",
+    "markdown_to_speech",
+    "markdown_to_text[large]",
+    "markdown_to_speech[large]",
+)
+def bench_markdown_to_text() -> dict[str, Callable]:
+    essay = "\n".join(ESSAY.format(word=f"word{i}") for i in range(10))
+    large = "\n".join(ESSAY.format(word=f"word{i}") for i in range(500))
+    return {
+        "markdown_to_text": lambda: markdown_to_text(essay),
+        "markdown_to_speech": lambda: markdown_to_speech(essay),
+        "markdown_to_text[large]": lambda: markdown_to_text(large),
+        "markdown_to_speech[large]": lambda: markdown_to_speech(large),
+    }
+
+
+@benchmarks("format_words[1000]")
+def bench_format_words() -> dict[str, Callable]:
+    # format_words rewrites the entries in place, so each call after the
+    # first one measures the scan without replacements
+    words = make_words(1_000)
+    return {"format_words[1000]": lambda: format_words(words)}
+
+
+@benchmarks(
+    "query_text_from_mdx[mdx]",
+    "query_text_from_mdx[lru]",
+    "query_text_from_mdx[store]",
+    requires="mdict_query",
+)
+def bench_mdx(tmp_dir: str) -> dict[str, Callable]:
+    entries = generate_entries(MDX_ENTRIES, SEED)
+    mdict.dictionary_file = os.path.join(tmp_dir, "fixture.mdx")
+    mdict.store_path = os.path.join(tmp_dir, "fixture")
+    write_mdx(mdict.dictionary_file, entries)
+    keys = list(entries)
+    rng = random.Random(SEED)
+    mdict.get_builder.cache_clear()
+    mdict.get_builder()  # builds the sqlite index outside of the timings
+
+    def cold():
+        mdict.query_text_from_mdx.cache_clear()
+        return mdict.query_text_from_mdx(rng.choice(keys))
+
+    def warm():
+        return mdict.query_text_from_mdx(keys[0])
+
+    def use_store(enabled: bool) -> None:
+        mdict.get_store.cache_clear()
+        if enabled and not mdict.PlaintextDictStore.exists(mdict.store_path):
+            mdict.build_plaintext_store()
+        elif not enabled:
+            for ext in (".idx", ".dat"):
+                if os.path.exists(mdict.store_path + ext):
+                    os.remove(mdict.store_path + ext)
+
+    # each entry switches the lookup path before it is measured
+    return {
+        "query_text_from_mdx[mdx]": (lambda: use_store(False), cold),
+        "query_text_from_mdx[lru]": (lambda: use_store(False), warm),
+        "query_text_from_mdx[store]": (lambda: use_store(True), cold),
+    }
+
+
+GROUPS = [
+    bench_subarray,
+    bench_word_links,
+    bench_word_cards,
+    bench_markdown_to_text,
+    bench_format_words,
+    bench_mdx,
+]
+
+
+def run(name_filter: str) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for group in GROUPS:
+            # the fixtures of a group are only built when one of its names is run
+            if not any(name_filter in name for name in group.names):
+                continue
+            if group.requires and importlib.util.find_spec(group.requires) is None:
+                print(f"skipping {', '.join(group.names)}: {group.requires} is missing")
+                continue
+            benches = group(tmp_dir) if group is bench_mdx else group()
+            for name, bench in benches.items():
+                if name_filter not in name:
+                    continue
+                if isinstance(bench, tuple):
+                    setup, bench = bench
+                    setup()
+                random.seed(SEED)
+                results[name] = measure(bench)
+                print(f"{name:45} {results[name]['best'] * 1e6:12.2f} us", flush=True)
+    return results
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\ncompared to {baseline['commit']} ({baseline_path}):")
+    for name, result in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:45} new")
+            continue
+        change = result["best"] / old["best"] - 1
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{name:45} {change:+8.1%}{flag}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", default="", help="only run matching benchmarks")
+    parser.add_argument("--output", help="JSON result file")
+    parser.add_argument("--compare", help="earlier JSON result file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown reported as a regression (default: 0.1)",
+    )
+    args = parser.parse_args()
+
+    results = run(args.filter)
+    write_report(results, args.output)
+    if args.compare:
+        compare(results, args.compare, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
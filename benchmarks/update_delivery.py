@@ -0,0 +1,291 @@
+"""
+Update delivery latency of polling and webhook mode against a fake Bot API.
+
+    python benchmarks/update_delivery.py [--mode polling|webhook|both] [--updates N]
+
+The bot runs as a subprocess whose TG_BASE_URL points at a local fake Bot API.
+Each /unset update is delivered through getUpdates or posted to the webhook,
+and the latency is the time until the bot's reply reaches the fake API.
+Webhook mode also checks that an update with a wrong secret token is refused.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import resource
+import signal
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import httpx
+
+from common import project_dir, write_report
+
+TOKEN = "123456:BENCHMARK"
+USER_ID = 1
+SECRET = "benchmark-secret"
+
+
+class FakeBotAPI:
+    """Answers the Bot API methods the bot calls during the benchmark."""
+
+    def __init__(self):
+        self.updates: list[dict] = []
+        self.new_update = asyncio.Event()
+        self.replies: asyncio.Queue[tuple[float, str]] = asyncio.Queue()
+        self.webhook: dict | None = None
+        self.polled = asyncio.Event()
+        self.calls: dict[str, int] = {}
+        self._message_ids = itertools.count(1000)
+
+    async def handle(self, reader, writer) -> None:
+        try:
+            # httpx keeps the connection alive between requests
+            while request_line := await reader.readline():
+                headers = {}
+                while (line := await reader.readline()).strip():
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                path = request_line.decode("latin-1").split()[1]
+                method = path.rsplit("/", 1)[-1]
+                result = await self.call(method, self.parse(headers, body))
+                payload = json.dumps({"ok": True, "result": result}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(payload)}\r\n\r\n".encode()
+                    + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # the bot went away, or a held getUpdates was cut off at shutdown
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def parse(headers: dict, body: bytes) -> dict:
+        if not body:
+            return {}
+        if headers.get("content-type", "").startswith("application/json"):
+            return json.loads(body)
+        params = dict(urllib.parse.parse_qsl(body.decode()))
+        for key, value in params.items():
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                pass
+        return params
+
+    async def call(self, method: str, params: dict):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == "getMe":
+            return {
+                "id": 123456,
+                "is_bot": True,
+                "first_name": "Benchmark",
+                "username": "benchmark_bot",
+            }
+        if method == "setWebhook":
+            self.webhook = params
+            return True
+        if method == "getUpdates":
+            self.polled.set()
+            return await self.get_updates(params)
+        if method == "sendMessage":
+            self.replies.put_nowait((time.perf_counter(), params.get("text", "")))
+            return {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "text": params.get("text", ""),
+            }
+        return True
+
+    async def get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset", 0) or 0)
+        self.updates = [u for u in self.updates if u["update_id"] >= offset]
+        if not self.updates:
+            self.new_update.clear()
+            try:
+                await asyncio.wait_for(
+                    self.new_update.wait(), float(params.get("timeout", 0) or 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+        return self.updates
+
+
+def make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": USER_ID, "type": "private"},
+            "from": {"id": USER_ID, "is_bot": False, "first_name": "Bench"},
+            "text": "/unset",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        },
+    }
+
+
+async def wait_ready(
+    api: FakeBotAPI, mode: str, webhook_url: str, bot, log_path: str
+) -> None:
+    async with httpx.AsyncClient() as client:
+        while bot.returncode is None:
+            if mode == "polling" and api.polled.is_set():
+                return
+            if mode == "webhook" and api.webhook is not None:
+                # the webhook server starts listening shortly after setWebhook
+                try:
+                    await client.get(webhook_url)
+                    return
+                except httpx.TransportError:
+                    pass
+            await asyncio.sleep(0.1)
+    with open(log_path, encoding="utf-8", errors="replace") as f:
+        log_tail = "".join(f.readlines()[-20:])
+    raise RuntimeError(f"the bot exited with {bot.returncode}:\n{log_tail}")
+
+
+async def bench_mode(mode: str, updates: int, idle: float, work_dir: str) -> dict:
+    api = FakeBotAPI()
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    api_port = server.sockets[0].getsockname()[1]
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        webhook_port = s.getsockname()[1]
+    webhook_url = f"http://127.0.0.1:{webhook_port}/telegram"
+    env = {
+        **os.environ,
+        "TG_BOT_TOKEN": TOKEN,
+        "TG_IDS": str(USER_ID),
+        "TG_BASE_URL": f"http://127.0.0.1:{api_port}/bot",
+        "TG_CHAT_RATE": "1000",
+        "OAI_API_KEY": "benchmark",
+        "METRICS_PORT": "0",
+        "TTS_CACHE_PATH": "",
+        "JINA_CACHE_PATH": "",
+    }
+    if mode == "webhook":
+        env.update(
+            TG_WEBHOOK_URL=f"http://127.0.0.1:{webhook_port}",
+            TG_WEBHOOK_LISTEN="127.0.0.1",
+            TG_WEBHOOK_PORT=str(webhook_port),
+            TG_WEBHOOK_PATH="telegram",
+            TG_WEBHOOK_SECRET=SECRET,
+        )
+    log_path = os.path.join(work_dir, f"{mode}.log")
+    with open(log_path, "wb") as log:
+        bot = await asyncio.create_subprocess_exec(
+            sys.executable,
+            os.path.join(project_dir, "main.py"),
+            cwd=work_dir,
+            env=env,
+            stdout=log,
+            stderr=log,
+        )
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result = {}
+    try:
+        await asyncio.wait_for(wait_ready(api, mode, webhook_url, bot, log_path), 60)
+        async with httpx.AsyncClient() as client:
+            if mode == "webhook":
+                response = await client.post(
+                    webhook_url,
+                    json=make_update(0),
+                    headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"},
+                )
+                result["wrong_secret_status"] = response.status_code
+                await asyncio.sleep(1)
+                result["wrong_secret_replied"] = not api.replies.empty()
+
+            latencies = []
+            for update_id in range(1, updates + 1):
+                update = make_update(update_id)
+                start = time.perf_counter()
+                if mode == "webhook":
+                    await client.post(
+                        webhook_url,
+                        json=update,
+                        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+                    )
+                else:
+                    api.updates.append(update)
+                    api.new_update.set()
+                replied, _ = await asyncio.wait_for(api.replies.get(), 30)
+                latencies.append(replied - start)
+
+        calls_before = sum(api.calls.values())
+        await asyncio.sleep(idle)
+        idle_calls = sum(api.calls.values()) - calls_before
+    finally:
+        if bot.returncode is None:
+            bot.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(bot.wait(), 30)
+        except asyncio.TimeoutError:
+            bot.kill()
+            await bot.wait()
+        server.close()
+        await server.wait_closed()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    latencies.sort()
+    result.update(
+        {
+            "updates": updates,
+            "latency_median": statistics.median(latencies),
+            "latency_p95": latencies[int(len(latencies) * 0.95) - 1],
+            "latency_max": latencies[-1],
+            "idle_seconds": idle,
+            "idle_api_calls": idle_calls,
+            "bot_cpu_seconds": (usage.ru_utime - usage_before.ru_utime)
+            + (usage.ru_stime - usage_before.ru_stime),
+            "api_calls": api.calls,
+        }
+    )
+    return result
+
+
+async def main_async(args) -> dict:
+    modes = ["polling", "webhook"] if args.mode == "both" else [args.mode]
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for mode in modes:
+            results[mode] = await bench_mode(mode, args.updates, args.idle, work_dir)
+            r = results[mode]
+            print(
+                f"{mode:8} median {r['latency_median'] * 1e3:8.2f} ms  "
+                f"p95 {r['latency_p95'] * 1e3:8.2f} ms  "
+                f"idle api calls {r['idle_api_calls']:4}  "
+                f"cpu {r['bot_cpu_seconds']:.2f} s",
+                flush=True,
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--mode", choices=["polling", "webhook", "both"], default="both"
+    )
+    parser.add_argument("--updates", type=int, default=50)
+    parser.add_argument(
+        "--idle", type=float, default=5, help="seconds to count idle API calls"
+    )
+    parser.add_argument("--output", help="JSON result file")
+    args = parser.parse_args()
+
+    write_report(asyncio.run(main_async(args)), args.output, "update_delivery-")
+
+
+if __name__ == "__main__":
+    main()
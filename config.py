@@ -50,6 +50,13 @@ sys_message_explanation = """You are a professional English teacher.
                     -----------------             
                     """
 
+sys_message_explanation_batch = sys_message_explanation + """
+                    You will be given a JSON list of words with their original explanations.
+                    Explain every word in the format above, and reply with a single JSON object only:
+                    each key is one of the given words exactly as written,
+                    each value is the Markdown explanation of that word.
+                    """
+
 sys_message_writer = """
 You are a professional English writer.
 Given some English words, Utilize all of the provided English words to compose an essay that does not exceed 280 words. (Do not omit any word from the list). 
@@ -99,19 +106,87 @@ Finally, provide a comprehensive explanation of all the words used in the essay,
 ALLOWED_USER_IDS = [int(id_str) for id_str in os.getenv("TG_IDS", "0").split(",")]
 
 TG_BOT_TOKEN = os.getenv("TG_BOT_TOKEN")
+# Bot API endpoint, e.g. a local Bot API server or a fake one in benchmarks
+TG_BASE_URL = os.getenv("TG_BASE_URL", "https://api.telegram.org/bot")
+TG_BASE_FILE_URL = os.getenv("TG_BASE_FILE_URL", "https://api.telegram.org/file/bot")
+
+# Webhook mode, used instead of polling when TG_WEBHOOK_URL is set to the
+# public https URL that Telegram delivers updates to (without the path)
+TG_WEBHOOK_URL = os.getenv("TG_WEBHOOK_URL", "")
+TG_WEBHOOK_LISTEN = os.getenv("TG_WEBHOOK_LISTEN", "0.0.0.0")
+TG_WEBHOOK_PORT = int(os.getenv("TG_WEBHOOK_PORT", "8443"))
+TG_WEBHOOK_PATH = os.getenv("TG_WEBHOOK_PATH", "telegram")
+# Checked against the X-Telegram-Bot-Api-Secret-Token header, random when empty
+TG_WEBHOOK_SECRET = os.getenv("TG_WEBHOOK_SECRET", "")
+TG_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TG_WEBHOOK_MAX_CONNECTIONS", "40"))
 
 EUDIC_TOKEN = os.getenv("EUDIC_TOKEN")
 
 VOICE = os.getenv("EDGE_TTS_VOICE", "en-US-AvaMultilingualNeural")
 
+# Cache of synthesized speech and Telegram file_ids, disabled when empty
+TTS_CACHE_PATH = os.getenv("TTS_CACHE_PATH", "tts_cache.db")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Long text is synthesized as concurrent chunks of this many characters, 0 disables
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "1200"))
+TTS_CHUNK_CONCURRENCY = int(os.getenv("TTS_CHUNK_CONCURRENCY", "4"))
+
+# Whether the reminder audio reads out the word explanations after the essay
+TTS_INCLUDE_EXPLANATION = os.getenv("TTS_INCLUDE_EXPLANATION", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
 CHOSEN_WORDS_SIZE = int(os.getenv("WORDS_SIZE", "10"))
 
-MESSAGE_SEND_INTERVAL = int(os.getenv("MESSAGE_SEND_INTERVAL", "25"))
+# Spaced repetition picks the most-due words, otherwise a random window is chosen
+SRS_ENABLED = os.getenv("SRS_ENABLED", "true").lower() in ("1", "true", "yes")
+SRS_STATE_PATH = os.getenv("SRS_STATE_PATH", "review_state.json")
+SRS_SHOWN_DELAY_HOURS = float(os.getenv("SRS_SHOWN_DELAY_HOURS", "24"))
+
+# Per-chat reminder schedules, /set picks one minute per hour in the chat's timezone
+SCHEDULES_PATH = os.getenv("SCHEDULES_PATH", "schedules.json")
+REMINDER_TIMEZONE = os.getenv("REMINDER_TIMEZONE", "Asia/Shanghai")
+REMINDER_HOURS = [
+    int(h) for h in os.getenv("REMINDER_HOURS", "8,9,12,19,20,21").split(",")
+]
+REMINDER_MINUTES = list(range(15, 56))
+# Maximum number of reminders generating content at the same time
+REMINDER_BUILD_CONCURRENCY = int(os.getenv("REMINDER_BUILD_CONCURRENCY", "2"))
+# Minutes ahead of each reminder its content is generated, 0 generates it on delivery
+PREBUILD_LEAD_MINUTES = int(os.getenv("PREBUILD_LEAD_MINUTES", "10"))
+
+# Telegram send limits: messages per second overall and per private chat,
+# messages per minute per group, and retries after a RetryAfter error
+TG_OVERALL_RATE = float(os.getenv("TG_OVERALL_RATE", "30"))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))
+TG_GROUP_RATE_PER_MINUTE = float(os.getenv("TG_GROUP_RATE_PER_MINUTE", "20"))
+TG_MAX_RETRIES = int(os.getenv("TG_MAX_RETRIES", "3"))
+# Replaced by the send limits above, only read to warn deployments still setting it
+MESSAGE_SEND_INTERVAL = os.getenv("MESSAGE_SEND_INTERVAL")
+
+# Maximum number of updates handled at the same time, one at a time per user
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+
+# Maximum number of words looked up and explained by the LLM at the same time
+EXPLAIN_CONCURRENCY = int(os.getenv("EXPLAIN_CONCURRENCY", "4"))
+
+# Words explained per LLM call as one JSON reply, 0 explains every word separately
+EXPLAIN_BATCH_SIZE = int(os.getenv("EXPLAIN_BATCH_SIZE", "0"))
+# Extra batched calls for the words missing from or malformed in a reply
+EXPLAIN_BATCH_RETRIES = int(os.getenv("EXPLAIN_BATCH_RETRIES", "1"))
+
+# Seconds between edits of a message that shows a streamed LLM reply
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
 
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
 GROQ_MODEL_NAME = os.environ.get("GROQ_MODEL_NAME", "llama-3.2-90b-text-preview")
 GROQ_TEMPERATURE = float(os.environ.get("GROQ_TEMPERATURE", "0.2"))
 GROQ_TOP_P = float(os.environ.get("GROQ_TOP_P", "0.6"))
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+GROQ_MAX_TOKENS = int(os.environ.get("GROQ_MAX_TOKENS", "8192"))
 
 OAI_API_KEY = os.environ.get("OAI_API_KEY")
 OAI_BASE_URL = os.environ.get(
@@ -121,3 +196,76 @@ OAI_TEMPERATURE = float(os.environ.get("OAI_TEMPERATURE", "1.0"))
 OAI_TOP_P = float(os.environ.get("OAI_TOP_P", "0.95"))
 OAI_MODEL_NAME = os.environ.get("OAI_MODEL_NAME", "gemini-2.0-flash-exp")
 OAI_MAX_TOKENS = int(os.environ.get("OAI_MAX_TOKENS", "8192"))
+
+# LLM providers in order of preference, those without an API key are skipped
+LLM_PROVIDERS = [
+    p.strip()
+    for p in os.environ.get("LLM_PROVIDERS", "oai,groq").split(",")
+    if p.strip()
+]
+# Ask a second provider when the first is slower than its p95 latency
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", "3"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BACKOFF = float(os.environ.get("LLM_RETRY_BACKOFF", "1"))
+# Consecutive failures that open a provider's circuit, and seconds it stays open
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "60"))
+
+# On-disk cache of LLM completions, disabled when the path is empty
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "")
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", str(3600 * 24 * 30)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# Shared HTTP clients, HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("HTTP_KEEPALIVE_EXPIRY", "60"))
+EUDIC_HTTP_TIMEOUT = float(os.environ.get("EUDIC_HTTP_TIMEOUT", "120"))
+EUDIC_HTTP_MAX_CONNECTIONS = int(os.environ.get("EUDIC_HTTP_MAX_CONNECTIONS", "10"))
+JINA_HTTP_TIMEOUT = float(os.environ.get("JINA_HTTP_TIMEOUT", "600"))
+JINA_HTTP_MAX_CONNECTIONS = int(os.environ.get("JINA_HTTP_MAX_CONNECTIONS", "5"))
+TELEGRAPH_HTTP_TIMEOUT = float(os.environ.get("TELEGRAPH_HTTP_TIMEOUT", "60"))
+TELEGRAPH_HTTP_MAX_CONNECTIONS = int(
+    os.environ.get("TELEGRAPH_HTTP_MAX_CONNECTIONS", "10")
+)
+
+# Local mirror of the Eudic study list
+VOCABULARY_STORE_PATH = os.environ.get("VOCABULARY_STORE_PATH", "vocabulary.json")
+VOCABULARY_SYNC_INTERVAL = int(os.environ.get("VOCABULARY_SYNC_INTERVAL", "3600"))
+VOCABULARY_SYNC_PAGE_SIZE = int(os.environ.get("VOCABULARY_SYNC_PAGE_SIZE", "500"))
+
+# Precompiled plaintext dictionary, defaults to static/MerriamWebsterV3.{dat,idx}
+MDICT_STORE_PATH = os.environ.get("MDICT_STORE_PATH", "")
+MDICT_LRU_SIZE = int(os.environ.get("MDICT_LRU_SIZE", "1024"))
+
+# Rendered dictionary link blocks of word cards kept in memory
+LINK_BLOCK_CACHE_SIZE = int(os.environ.get("LINK_BLOCK_CACHE_SIZE", "1024"))
+
+# Pool running CPU-bound dictionary and markdown work, "thread" or "process"
+CPU_POOL_KIND = os.environ.get("CPU_POOL_KIND", "thread")
+CPU_POOL_WORKERS = int(os.environ.get("CPU_POOL_WORKERS", "4"))
+
+# Local Prometheus endpoint with per-stage timings, disabled when the port is 0
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+
+# Telegraph accounts, comma-separated tokens or a file the created tokens are kept in
+TELEGRAPH_ACCESS_TOKENS = os.environ.get("TELEGRAPH_ACCESS_TOKENS", "")
+TELEGRAPH_TOKEN_PATH = os.environ.get("TELEGRAPH_TOKEN_PATH", "telegraph_tokens.txt")
+TELEGRAPH_ACCOUNT_POOL_SIZE = int(os.environ.get("TELEGRAPH_ACCOUNT_POOL_SIZE", "1"))
+
+# Telegraph pages are kept below this many bytes of HTML, longer articles are
+# published as several pages, created concurrently, behind an index page
+TELEGRAPH_PAGE_BYTES = int(os.environ.get("TELEGRAPH_PAGE_BYTES", "40000"))
+TELEGRAPH_PAGE_CONCURRENCY = int(os.environ.get("TELEGRAPH_PAGE_CONCURRENCY", "4"))
+
+# Articles fetched by /jina, reused without a request for JINA_CACHE_TTL seconds
+# and revalidated with ETag/Last-Modified after that; the cache is off when empty
+JINA_CACHE_PATH = os.environ.get("JINA_CACHE_PATH", "jina_cache.db")
+JINA_CACHE_TTL = int(os.environ.get("JINA_CACHE_TTL", "3600"))
+JINA_CACHE_MAX_ENTRIES = int(os.environ.get("JINA_CACHE_MAX_ENTRIES", "500"))
+JINA_MAX_BYTES = int(os.environ.get("JINA_MAX_BYTES", str(5 * 1024 * 1024)))
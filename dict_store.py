@@ -0,0 +1,71 @@
+import json
+import mmap
+import os
+from typing import Iterable
+
+
+class PlaintextDictStore:
+    """
+    Read-only dictionary of plaintext definitions keyed by lowercased headword.
+
+    The store is two files: `<path>.dat` holds the UTF-8 definitions back to
+    back and is memory-mapped, `<path>.idx` maps every headword to the offset
+    and length of its definition.
+    """
+
+    def __init__(self, index: dict[str, list[int]], data: mmap.mmap):
+        self._index = index
+        self._data = data
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(f"{path}.idx") and os.path.exists(f"{path}.dat")
+
+    @classmethod
+    def open(cls, path: str) -> "PlaintextDictStore":
+        with open(f"{path}.idx", encoding="utf-8") as f:
+            index = json.load(f)
+        with open(f"{path}.dat", "rb") as f:
+            # an empty file cannot be mapped
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if index else b""
+        return cls(index, data)
+
+    @staticmethod
+    def build(entries: Iterable[tuple[str, str]], path: str) -> int:
+        """
+        Writes a store from (headword, definition) pairs.
+
+        Parameters:
+            entries (Iterable): Headwords and their plaintext definitions, the
+                first definition of a lowercased headword wins.
+            path (str): The store path without extension.
+
+        Returns:
+            int: The number of headwords written.
+        """
+        index = {}
+        offset = 0
+        with open(f"{path}.dat.tmp", "wb") as f:
+            for headword, text in entries:
+                key = headword.lower()
+                if key in index:
+                    continue
+                data = text.encode("utf-8")
+                f.write(data)
+                index[key] = [offset, len(data)]
+                offset += len(data)
+        with open(f"{path}.idx.tmp", "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(f"{path}.dat.tmp", f"{path}.dat")
+        os.replace(f"{path}.idx.tmp", f"{path}.idx")
+        return len(index)
+
+    def lookup(self, keyword: str) -> str:
+        entry = self._index.get(keyword.lower())
+        if entry is None:
+            return ""
+        offset, length = entry
+        return self._data[offset : offset + length].decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._index)
@@ -3,9 +3,10 @@ import logging
 import pprint
 
 import httpx
-from async_lru import alru_cache
 
 from config import EUDIC_TOKEN
+from http_clients import get_client
+from metrics import timed
 
 headers = {
     "User-Agent": "insomnium/0.2.3-a",
@@ -13,6 +14,7 @@ headers = {
 }
 
 
+@timed("eudic", "add")
 async def add_words_to_eudic(payload: dict) -> dict:
     """
     Asynchronously adds words to the Eudic word list via a POST request.
@@ -25,10 +27,9 @@ async def add_words_to_eudic(payload: dict) -> dict:
     """
     url = "https://api.frdic.com/api/open/v1/studylist/words"
     try:
-        async with httpx.AsyncClient(timeout=120) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()  # Raises an exception for 4XX/5XX errors
-            return response.json()  # Directly return the JSON response
+        response = await get_client("eudic").post(url, json=payload, headers=headers)
+        response.raise_for_status()  # Raises an exception for 4XX/5XX errors
+        return response.json()  # Directly return the JSON response
     except httpx.RequestError as e:
         logging.error(f"Request error occurred: {e}")
         raise  # Rethrowing the exception for the caller to handle
@@ -37,6 +38,7 @@ async def add_words_to_eudic(payload: dict) -> dict:
         raise  # Rethrowing the exception for the caller to handle
 
 
+@timed("eudic", "remove")
 async def remove_words_from_eudic(payload: dict) -> bool:
     """
     Asynchronously deletes words from the Eudic word list via a DELETE request.
@@ -49,15 +51,14 @@ async def remove_words_from_eudic(payload: dict) -> bool:
     """
     url = "https://api.frdic.com/api/open/v1/studylist/words"
     try:
-        async with httpx.AsyncClient(timeout=120) as client:
-            response = await client.request(
-                url=url, method="DELETE", json=payload, headers=headers
-            )
-            if response.status_code == 204:
-                return True
-            else:
-                logging.error("Failed to delete words: HTTP %s", response.status_code)
-                return False
+        response = await get_client("eudic").request(
+            url=url, method="DELETE", json=payload, headers=headers
+        )
+        if response.status_code == 204:
+            return True
+        else:
+            logging.error("Failed to delete words: HTTP %s", response.status_code)
+            return False
     except httpx.RequestError as e:
         logging.error("Request error occurred: %s", str(e))
         return False
@@ -66,7 +67,7 @@ async def remove_words_from_eudic(payload: dict) -> bool:
         return False
 
 
-@alru_cache(ttl=3600 * 1)
+@timed("eudic", "list")
 async def list_eudic_vocabulary(page, page_size=50):
     querystring = {"language": "en", "page": str(page), "page_size": str(page_size)}
     url = "https://api.frdic.com/api/open/v1/studylist/words/0"
@@ -75,10 +76,11 @@ async def list_eudic_vocabulary(page, page_size=50):
         querystring = {"language": "en"}
 
     try:
-        async with httpx.AsyncClient(timeout=120) as client:
-            response = await client.get(url, headers=headers, params=querystring)
-            logging.debug(f"{response.headers=}, {url=}, {querystring=}, {headers=}")
-            return response.json()["data"]
+        response = await get_client("eudic").get(
+            url, headers=headers, params=querystring
+        )
+        logging.debug(f"{response.headers=}, {url=}, {querystring=}, {headers=}")
+        return response.json()["data"]
     except httpx.RequestError as e:
         logging.error(f"Request error occurred: {e}")
         raise  # Rethrowing the exception for the caller to handle
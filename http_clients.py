@@ -0,0 +1,77 @@
+import importlib.util
+import logging
+
+import httpx
+
+from config import (
+    HTTP2_ENABLED,
+    HTTP_KEEPALIVE_EXPIRY,
+    EUDIC_HTTP_TIMEOUT,
+    EUDIC_HTTP_MAX_CONNECTIONS,
+    JINA_HTTP_TIMEOUT,
+    JINA_HTTP_MAX_CONNECTIONS,
+    TELEGRAPH_HTTP_TIMEOUT,
+    TELEGRAPH_HTTP_MAX_CONNECTIONS,
+)
+
+# timeout (seconds) and connection pool size of every upstream service
+SERVICES = {
+    "eudic": (EUDIC_HTTP_TIMEOUT, EUDIC_HTTP_MAX_CONNECTIONS),
+    "jina": (JINA_HTTP_TIMEOUT, JINA_HTTP_MAX_CONNECTIONS),
+    "telegraph": (TELEGRAPH_HTTP_TIMEOUT, TELEGRAPH_HTTP_MAX_CONNECTIONS),
+}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_available() -> bool:
+    if not HTTP2_ENABLED:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logging.warning("HTTP/2 requested but h2 is not installed, using HTTP/1.1")
+        return False
+    return True
+
+
+def _create_client(service: str) -> httpx.AsyncClient:
+    timeout, max_connections = SERVICES[service]
+    return httpx.AsyncClient(
+        timeout=timeout,
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def get_client(service: str) -> httpx.AsyncClient:
+    """
+    Returns the shared client of an upstream service, creating it on first use.
+
+    Parameters:
+        service (str): One of the keys of SERVICES.
+
+    Returns:
+        httpx.AsyncClient: A client that keeps its connections alive between calls.
+    """
+    client = _clients.get(service)
+    if client is None or client.is_closed:
+        client = _clients[service] = _create_client(service)
+    return client
+
+
+async def init_http_clients() -> None:
+    """Creates the clients of all upstream services."""
+    for service in SERVICES:
+        get_client(service)
+    logging.info(f"http clients ready: {list(_clients)}")
+
+
+async def close_http_clients() -> None:
+    """Closes all clients and their pooled connections."""
+    while _clients:
+        service, client = _clients.popitem()
+        await client.aclose()
+        logging.info(f"http client closed: {service}")
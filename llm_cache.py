@@ -0,0 +1,141 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+class CompletionCache:
+    """
+    On-disk cache of chat completion results backed by SQLite.
+
+    Entries expire after `ttl` seconds and the least recently used entries are
+    evicted once the cache holds more than `max_entries` results.
+    """
+
+    def __init__(self, path: str, ttl: int, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS completions (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS completions_accessed_at "
+                "ON completions (accessed_at)"
+            )
+
+    @staticmethod
+    def make_key(
+        model: str,
+        temperature: float,
+        top_p: float,
+        max_tokens: int,
+        sys_prompt: str,
+        prompt: str,
+        response_format: dict | None = None,
+    ) -> str:
+        """
+        Builds the cache key of a completion request.
+
+        Parameters:
+            model (str): The model name.
+            temperature (float): The sampling temperature.
+            top_p (float): The nucleus sampling parameter.
+            max_tokens (int): The completion token limit.
+            sys_prompt (str): The system prompt, only its hash is part of the key.
+            prompt (str): The user prompt.
+            response_format (dict): The requested response format, if any.
+
+        Returns:
+            str: A hex digest identifying the request.
+        """
+        sys_prompt_hash = hashlib.sha256(sys_prompt.encode()).hexdigest()
+        material = json.dumps(
+            [
+                model,
+                temperature,
+                top_p,
+                max_tokens,
+                sys_prompt_hash,
+                prompt,
+                response_format,
+            ],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        return self.get_any([key])
+
+    def get_any(self, keys: list[str]) -> str | None:
+        """
+        Looks up the first of several keys that holds a fresh entry, counting
+        a single hit or miss for the whole lookup.
+
+        Parameters:
+            keys (list): The keys to try, in order.
+
+        Returns:
+            str: The cached value, None on a miss.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                if now - row[1] > self.ttl:
+                    self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    continue
+                self._conn.execute(
+                    "UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute(
+            "DELETE FROM completions WHERE created_at < ?", (now - self.ttl,)
+        )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                """
+                DELETE FROM completions WHERE key IN (
+                    SELECT key FROM completions ORDER BY accessed_at LIMIT ?
+                )
+                """,
+                (count - self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "size": size}
@@ -1,44 +1,208 @@
 import asyncio
+import json
 import logging
-
-from openai import AsyncOpenAI
+import re
+from typing import AsyncIterator, Callable
 
 from config import (
     sys_message_writer,
-    OAI_API_KEY,
-    OAI_BASE_URL,
-    OAI_TEMPERATURE,
-    OAI_TOP_P,
-    OAI_MAX_TOKENS,
-    OAI_MODEL_NAME,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES,
+)
+from llm_cache import CompletionCache
+from llm_router import Provider, router
+from metrics import record_llm_usage
+
+completion_cache = (
+    CompletionCache(LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES)
+    if LLM_CACHE_PATH
+    else None
 )
 
-oaiClient = AsyncOpenAI(api_key=OAI_API_KEY, base_url=OAI_BASE_URL)
 
+def _messages(sys_prompt: str, prompt: str) -> list[dict]:
+    return [
+        {
+            "role": "system",
+            "content": sys_prompt,
+        },
+        {
+            "role": "user",
+            "content": prompt,
+        },
+    ]
 
-async def gen_chat_completion(sys_prompt: str, prompt: str) -> str:
-    logging.debug(
-        f"temperature: {OAI_TEMPERATURE}, top_p: {OAI_TOP_P}, model: {OAI_MODEL_NAME}"
+
+def _cache_key(
+    provider: Provider,
+    sys_prompt: str,
+    prompt: str,
+    response_format: dict | None = None,
+) -> str:
+    return CompletionCache.make_key(
+        provider.model,
+        provider.temperature,
+        provider.top_p,
+        provider.max_tokens,
+        sys_prompt,
+        prompt,
+        response_format,
     )
+
+
+def _cache_lookup(
+    sys_prompt: str, prompt: str, response_format: dict | None = None
+) -> str | None:
+    # a completion of any provider answers the prompt, try the fastest first
+    keys = [
+        _cache_key(provider, sys_prompt, prompt, response_format)
+        for provider in router.ranked() or router.providers
+    ]
+    return completion_cache.get_any(keys)
+
+
+async def _cache_get(
+    sys_prompt: str, prompt: str, response_format: dict | None = None
+) -> str | None:
+    """Returns the cached completion, None on a miss or without a cache."""
+    if not completion_cache:
+        return None
+    cached = await asyncio.to_thread(_cache_lookup, sys_prompt, prompt, response_format)
+    logging.debug(f"llm cache {completion_cache.hits=}, {completion_cache.misses=}")
+    return cached
+
+
+async def _cache_set(
+    provider: Provider,
+    sys_prompt: str,
+    prompt: str,
+    content: str,
+    response_format: dict | None = None,
+):
+    if completion_cache and content:
+        key = _cache_key(provider, sys_prompt, prompt, response_format)
+        await asyncio.to_thread(completion_cache.set, key, content)
+
+
+def provider_stats() -> dict[str, dict]:
+    """Returns the request, error and latency figures of every LLM provider."""
+    return router.stats()
+
+
+async def gen_chat_completion(
+    sys_prompt: str,
+    prompt: str,
+    response_format: dict | None = None,
+    validate: Callable[[str], object] | None = None,
+) -> str:
+    """
+    Requests a completion, answered from the cache when possible.
+
+    Parameters:
+        sys_prompt (str): The system prompt.
+        prompt (str): The user prompt.
+        response_format (dict): The response format to request, if any.
+        validate (Callable): Called with a new completion before it is cached,
+            an exception it raises propagates and the completion is not cached.
+
+    Returns:
+        str: The completion.
+    """
     logging.debug(f"user message prompt: {prompt}")
-    chat_completion = await oaiClient.chat.completions.create(
-        temperature=OAI_TEMPERATURE,
-        top_p=OAI_TOP_P,
-        messages=[
-            {
-                "role": "system",
-                "content": sys_prompt,
-            },
-            {
-                "role": "user",
-                "content": prompt,
-            },
-        ],
-        model=OAI_MODEL_NAME,
-        max_tokens=OAI_MAX_TOKENS,
+    cached = await _cache_get(sys_prompt, prompt, response_format)
+    if cached is not None:
+        return cached
+
+    extra = {"response_format": response_format} if response_format else {}
+
+    async def call(provider: Provider) -> str:
+        chat_completion = await provider.client.chat.completions.create(
+            messages=_messages(sys_prompt, prompt),
+            **provider.params(),
+            **extra,
+        )
+        record_llm_usage(provider.name, chat_completion.usage)
+        return chat_completion.choices[0].message.content
+
+    provider, content = await router.complete(call)
+    logging.debug(f"{provider.name}: {content}")
+    if validate:
+        validate(content)
+    await _cache_set(provider, sys_prompt, prompt, content, response_format)
+    return content
+
+
+async def stream_chat_completion(sys_prompt: str, prompt: str) -> AsyncIterator[str]:
+    """
+    Streams a completion.
+
+    Yields:
+        str: The text deltas as the model generates them, or the whole cached
+            completion at once.
+    """
+    logging.debug(f"user message prompt (streamed): {prompt}")
+    cached = await _cache_get(sys_prompt, prompt)
+    if cached is not None:
+        yield cached
+        return
+
+    async def call(provider: Provider) -> AsyncIterator[str]:
+        stream = await provider.client.chat.completions.create(
+            messages=_messages(sys_prompt, prompt),
+            stream=True,
+            **provider.params(),
+        )
+        async for chunk in stream:
+            # only some providers report usage on a stream
+            record_llm_usage(provider.name, getattr(chunk, "usage", None))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    parts = []
+    provider = None
+    async for provider, delta in router.stream(call):
+        parts.append(delta)
+        yield delta
+    content = "".join(parts)
+    logging.debug(content)
+    if provider is not None:
+        await _cache_set(provider, sys_prompt, prompt, content)
+
+
+def _parse_json_object(content: str | None) -> dict:
+    """
+    Parses a JSON object reply.
+
+    Raises:
+        ValueError: If the reply is not a JSON object.
+    """
+    # some models still wrap the object in a markdown code fence
+    content = re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", content or "")
+    result = json.loads(content)
+    if not isinstance(result, dict):
+        raise ValueError(f"expected a JSON object, got {type(result).__name__}")
+    return result
+
+
+async def gen_json_completion(sys_prompt: str, prompt: str) -> dict:
+    """
+    Requests a JSON object reply. A malformed reply is not cached, so a retry
+    asks the model again.
+
+    Returns:
+        dict: The parsed reply.
+
+    Raises:
+        ValueError: If the reply is not a JSON object.
+    """
+    content = await gen_chat_completion(
+        sys_prompt,
+        prompt,
+        response_format={"type": "json_object"},
+        validate=_parse_json_object,
     )
-    logging.debug(chat_completion.choices[0].message.content)
-    return chat_completion.choices[0].message.content
+    return _parse_json_object(content)
 
 
 if __name__ == "__main__":
@@ -49,3 +213,4 @@ if __name__ == "__main__":
         )
     )
     print(txt)
+    print(provider_stats())
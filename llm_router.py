@@ -0,0 +1,369 @@
+import asyncio
+import collections
+import dataclasses
+import functools
+import logging
+import statistics
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable
+
+from config import (
+    LLM_PROVIDERS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF,
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_COOLDOWN,
+    OAI_API_KEY,
+    OAI_BASE_URL,
+    OAI_TEMPERATURE,
+    OAI_TOP_P,
+    OAI_MAX_TOKENS,
+    OAI_MODEL_NAME,
+    GROQ_API_KEY,
+    GROQ_BASE_URL,
+    GROQ_TEMPERATURE,
+    GROQ_TOP_P,
+    GROQ_MAX_TOKENS,
+    GROQ_MODEL_NAME,
+)
+from metrics import track
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+class NoProviderAvailable(Exception):
+    """Raised when every provider is unconfigured or has an open circuit."""
+
+
+class LatencyStats:
+    """Request counts and a sliding window of recent latencies of one provider."""
+
+    def __init__(self, window: int = 100):
+        self.latencies: collections.deque[float] = collections.deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, seconds: float) -> None:
+        self.requests += 1
+        self.latencies.append(seconds)
+
+    def record_error(self) -> None:
+        self.requests += 1
+        self.errors += 1
+
+    def percentile(self, p: int) -> float | None:
+        """Returns the p-th latency percentile, None before the first success."""
+        if not self.latencies:
+            return None
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[p - 1]
+
+
+class CircuitBreaker:
+    """
+    Stops routing to a provider after `failures` consecutive errors.
+
+    Once `cooldown` seconds have passed a single trial request is let through;
+    its success closes the circuit again, its failure restarts the cooldown.
+    """
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at: float | None = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def available(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._trial_running)
+
+    def acquire(self) -> None:
+        if self.state == "half_open":
+            self._trial_running = True
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.consecutive_failures >= self.failures:
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Gives up a trial request that was cancelled before it finished."""
+        self._trial_running = False
+
+
+@dataclasses.dataclass
+class Provider:
+    name: str
+    api_key: str
+    base_url: str
+    model: str
+    temperature: float
+    top_p: float
+    max_tokens: int
+    stats: LatencyStats = dataclasses.field(default_factory=LatencyStats)
+    breaker: CircuitBreaker = dataclasses.field(
+        default_factory=lambda: CircuitBreaker(
+            LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN
+        )
+    )
+
+    @functools.cached_property
+    def client(self) -> "AsyncOpenAI":
+        # openai is slow to import, it is loaded with the first request
+        from openai import AsyncOpenAI
+
+        # retries are handled by the router, across providers
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+
+    def params(self) -> dict:
+        """Returns the model parameters of a chat completion request."""
+        return {
+            "model": self.model,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_tokens,
+        }
+
+
+class ProviderRouter:
+    """
+    Routes completion requests to the fastest available provider.
+
+    Providers are ranked by their median latency, providers without samples
+    first and ties in configuration order. A failed request is retried on the
+    next ranking with exponential backoff. With hedging, a second provider is
+    asked once the first has been slower than its p95 latency, and whichever
+    answers first wins.
+    """
+
+    def __init__(
+        self,
+        providers: list[Provider],
+        hedge: bool,
+        hedge_min_delay: float,
+        max_retries: int,
+        retry_backoff: float,
+    ):
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def ranked(self, failed: set[str] = frozenset()) -> list[Provider]:
+        """Returns the available providers, best first and those in `failed` last."""
+        available = [p for p in self.providers if p.breaker.available()]
+        return sorted(
+            available,
+            key=lambda p: (p.name in failed, p.stats.percentile(50) or 0.0),
+        )
+
+    async def _attempt(
+        self,
+        provider: Provider,
+        call: Callable[[Provider], Awaitable[Any]],
+        failed: set[str],
+    ) -> tuple[Provider, Any]:
+        provider.breaker.acquire()
+        start = time.monotonic()
+        try:
+            with track("llm", provider.name):
+                result = await call(provider)
+        except asyncio.CancelledError:
+            provider.breaker.release()
+            raise
+        except Exception as e:
+            provider.stats.record_error()
+            provider.breaker.record_failure()
+            failed.add(provider.name)
+            logging.warning(f"llm provider {provider.name} failed: {e!r}")
+            raise
+        provider.stats.record(time.monotonic() - start)
+        provider.breaker.record_success()
+        return provider, result
+
+    def _hedge_delay(self, provider: Provider) -> float:
+        return max(self.hedge_min_delay, provider.stats.percentile(95) or 0.0)
+
+    async def _hedged(
+        self,
+        candidates: list[Provider],
+        call: Callable[[Provider], Awaitable[Any]],
+        failed: set[str],
+    ) -> tuple[Provider, Any]:
+        primary = asyncio.create_task(self._attempt(candidates[0], call, failed))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(
+                pending, timeout=self._hedge_delay(candidates[0])
+            )
+            if primary in done and not primary.exception():
+                return primary.result()
+            # the primary is slow or has already failed, ask the runner-up too
+            logging.info(f"hedging llm request to {candidates[1].name}")
+            pending.add(asyncio.create_task(self._attempt(candidates[1], call, failed)))
+            error = primary.exception() if primary in done else None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete(
+        self, call: Callable[[Provider], Awaitable[Any]]
+    ) -> tuple[Provider, Any]:
+        """
+        Runs a request against the providers until one succeeds, moving
+        providers that failed it to the back of the ranking.
+
+        Parameters:
+            call (Callable): Sends the request to the given provider.
+
+        Returns:
+            tuple: The provider that answered and the result of the call.
+
+        Raises:
+            NoProviderAvailable: If no provider can take the request.
+            Exception: The last provider error once the retries are exhausted.
+        """
+        failed = set()
+        for attempt in range(self.max_retries + 1):
+            candidates = self.ranked(failed)
+            if not candidates:
+                raise NoProviderAvailable("no llm provider available")
+            try:
+                if self.hedge and len(candidates) > 1:
+                    return await self._hedged(candidates, call, failed)
+                return await self._attempt(candidates[0], call, failed)
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+            await asyncio.sleep(self.retry_backoff * 2**attempt)
+
+    async def stream(
+        self, call: Callable[[Provider], AsyncIterator[str]]
+    ) -> AsyncIterator[tuple[Provider, str]]:
+        """
+        Streams a reply from the best provider, retrying only while nothing has
+        been yielded yet. Streams are not hedged and don't feed the latency stats.
+
+        Yields:
+            tuple: The answering provider and each text delta.
+        """
+        failed = set()
+        for attempt in range(self.max_retries + 1):
+            candidates = self.ranked(failed)
+            if not candidates:
+                raise NoProviderAvailable("no llm provider available")
+            provider = candidates[0]
+            provider.breaker.acquire()
+            started = False
+            try:
+                with track("llm_stream", provider.name):
+                    async for delta in call(provider):
+                        started = True
+                        yield provider, delta
+            except Exception as e:
+                provider.stats.record_error()
+                provider.breaker.record_failure()
+                failed.add(provider.name)
+                logging.warning(f"llm provider {provider.name} stream failed: {e!r}")
+                if started or attempt == self.max_retries:
+                    raise
+            except BaseException:
+                provider.breaker.release()
+                raise
+            else:
+                provider.stats.requests += 1
+                provider.breaker.record_success()
+                return
+            await asyncio.sleep(self.retry_backoff * 2**attempt)
+
+    def stats(self) -> dict[str, dict]:
+        """Returns the request, error and latency figures of every provider."""
+        return {
+            p.name: {
+                "requests": p.stats.requests,
+                "errors": p.stats.errors,
+                "p50": p.stats.percentile(50),
+                "p95": p.stats.percentile(95),
+                "circuit": p.breaker.state,
+            }
+            for p in self.providers
+        }
+
+
+def build_providers() -> list[Provider]:
+    """Creates the providers named in LLM_PROVIDERS that have an API key."""
+    settings = {
+        "oai": (
+            OAI_API_KEY,
+            OAI_BASE_URL,
+            OAI_MODEL_NAME,
+            OAI_TEMPERATURE,
+            OAI_TOP_P,
+            OAI_MAX_TOKENS,
+        ),
+        "groq": (
+            GROQ_API_KEY,
+            GROQ_BASE_URL,
+            GROQ_MODEL_NAME,
+            GROQ_TEMPERATURE,
+            GROQ_TOP_P,
+            GROQ_MAX_TOKENS,
+        ),
+    }
+    providers = []
+    for name in LLM_PROVIDERS:
+        if name not in settings:
+            raise ValueError(f"unknown llm provider {name} in LLM_PROVIDERS")
+        api_key, base_url, model, temperature, top_p, max_tokens = settings[name]
+        if not api_key:
+            continue
+        providers.append(
+            Provider(
+                name=name,
+                api_key=api_key,
+                base_url=base_url,
+                model=model,
+                temperature=temperature,
+                top_p=top_p,
+                max_tokens=max_tokens,
+            )
+        )
+    return providers
+
+
+router = ProviderRouter(
+    build_providers(),
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_DELAY,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF,
+)
@@ -6,42 +6,103 @@
 Simple Bot to send timed Telegram messages.
 
 """
+
 import asyncio
+import dataclasses
 import datetime
 import functools
+import hashlib
+import importlib
+import json
 import logging
-import os
 import random
 import re
+import secrets
+import time
 import traceback
 from typing import Callable, Coroutine
 from urllib.parse import quote
 
-import mistune
 import pytz
 import telegram
 import telegramify_markdown
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler
 
-from article import write_to_telegraph, markdown_to_text, fetch_markdown_from_url
+from article import (
+    telegraph_publisher,
+    write_to_telegraph,
+    markdown_to_html,
+    amarkdown_to_speech,
+    publish_article,
+    publish_pages,
+)
 from config import (
     ALLOWED_USER_IDS,
     TG_BOT_TOKEN,
+    TG_BASE_URL,
+    TG_BASE_FILE_URL,
+    TG_WEBHOOK_URL,
+    TG_WEBHOOK_LISTEN,
+    TG_WEBHOOK_PORT,
+    TG_WEBHOOK_PATH,
+    TG_WEBHOOK_SECRET,
+    TG_WEBHOOK_MAX_CONNECTIONS,
     sys_message_writer,
     CHOSEN_WORDS_SIZE,
     sys_message_explanation,
+    sys_message_explanation_batch,
+    TG_OVERALL_RATE,
+    TG_CHAT_RATE,
+    TG_GROUP_RATE_PER_MINUTE,
+    TG_MAX_RETRIES,
     MESSAGE_SEND_INTERVAL,
+    UPDATE_CONCURRENCY,
+    EXPLAIN_CONCURRENCY,
+    EXPLAIN_BATCH_SIZE,
+    EXPLAIN_BATCH_RETRIES,
+    VOICE,
+    TTS_INCLUDE_EXPLANATION,
+    SRS_ENABLED,
+    REMINDER_TIMEZONE,
+    REMINDER_BUILD_CONCURRENCY,
+    PREBUILD_LEAD_MINUTES,
+    STREAM_EDIT_INTERVAL,
+    VOCABULARY_SYNC_INTERVAL,
+    LINK_BLOCK_CACHE_SIZE,
+    METRICS_HOST,
+    METRICS_PORT,
 )
+from http_clients import init_http_clients, close_http_clients
 from eudic import (
-    list_eudic_vocabulary,
     format_words,
     add_words_to_eudic,
     remove_words_from_eudic,
 )
-from llm_client import gen_chat_completion
-from mdict import query_text_from_mdx
-from tts import gen_tts_audio
+from llm_client import (
+    gen_chat_completion,
+    gen_json_completion,
+    provider_stats,
+    stream_chat_completion,
+)
+from llm_router import router
+from mdict import aquery_text_from_mdx, load_dictionary
+from message_pack import MessagePacker
+from metrics import start_metrics_server, timed
+from offload import shutdown_executor, run_blocking
+from tts import gen_tts_audio_chunked
+from tts_cache import TTSCache, tts_cache
+from rate_limiter import PriorityRateLimiter, INTERACTIVE, BULK
+from schedules import schedule_store
+from startup import process_age, startup_report, warm_up_report
+from update_processor import UserLaneUpdateProcessor
+from srs import GRADES, review_scheduler
+from vocab_store import vocabulary_store
+
+# Maximum length of a Telegram text message
+TG_MESSAGE_LIMIT = 4096
+# Maximum bytes of the callback_data of an inline button
+TG_CALLBACK_DATA_LIMIT = 64
 
 # Enable logging
 logging.basicConfig(
@@ -79,13 +140,8 @@ def allowed_users_only(
     return wrapper
 
 
-def gen_word_links(i, w, word):
-    l = f"""
-**{i}. {word}**
-{w.get("exp", "")}
-
-{query_text_from_mdx(word)}
-
+def gen_link_block(word: str) -> str:
+    return f"""
 [🇺🇸 MAmE](https://dict.youdao.com/dictvoice?audio={quote(word)}&type=2)
 
 [🇬🇧  BrE](https://dict.youdao.com/dictvoice?audio={quote(word)}&type=1)
@@ -111,60 +167,186 @@ def gen_word_links(i, w, word):
 [Cambridge ](https://dictionary.cambridge.org/dictionary/english/{quote(word)})
 
 """
+
+
+@functools.lru_cache(maxsize=LINK_BLOCK_CACHE_SIZE)
+def render_link_block(word: str) -> str:
+    """Returns the dictionary links of a word rendered as MarkdownV2, one per line."""
+    return re.sub(r"\n+", "\n", telegramify_markdown.markdownify(gen_link_block(word)))
+
+
+def gen_word_head(i, w, word, definition):
+    return f"""
+**{i}. {word}**
+{w.get("exp", "")}
+
+{definition}
+"""
+
+
+def gen_word_links(i, w, word, definition):
+    l = gen_word_head(i, w, word, definition) + gen_link_block(word)
     return l
 
 
-async def send_telegraph(context, chat_id, text, reply_to_message_id=None):
+def render_word_card(
+    i: int, w: dict, word: str, definition: str, explanation: str
+) -> str:
+    """
+    Renders a word card as MarkdownV2: the word with its definitions, the
+    dictionary links and the LLM explanation.
+    """
+    head = telegramify_markdown.markdownify(gen_word_head(i, w, word, definition))
+    head = re.sub(r"\n+", "\n", head).strip("\n")
+    links = render_link_block(word).strip("\n")
+    return f"{head}\n{links}\n\n{telegramify_markdown.markdownify(explanation).strip()}"
+
+
+async def send_telegraph(
+    context, chat_id, text, reply_to_message_id=None, rate_limit_args=INTERACTIVE
+):
     try:
-        article_url = await write_to_telegraph(
-            mistune.create_markdown(
-                escape=False,
-                hard_wrap=True,
-                plugins=["strikethrough", "footnotes", "table", "speedup"],
-            )(
-                text,
-            )
-        )
+        article_url = await publish_pages(text)
         await context.bot.send_message(
-            chat_id, article_url, reply_to_message_id=reply_to_message_id
+            chat_id,
+            article_url,
+            reply_to_message_id=reply_to_message_id,
+            rate_limit_args=rate_limit_args,
         )
     except Exception as e:
         logging.exception(e)
         try:
-            article_url = await write_to_telegraph(
-                mistune.create_markdown(
-                    escape=False,
-                    hard_wrap=True,
-                    plugins=["strikethrough", "footnotes", "table", "speedup"],
-                )(
-                    telegramify_markdown.convert(text),
-                )
-            )
+            article_url = await publish_pages(telegramify_markdown.markdownify(text))
             await context.bot.send_message(
-                chat_id, article_url, reply_to_message_id=reply_to_message_id
+                chat_id,
+                article_url,
+                reply_to_message_id=reply_to_message_id,
+                rate_limit_args=rate_limit_args,
             )
         except Exception as e:
             logging.exception(e)
             await context.bot.send_message(
                 chat_id,
                 f"{chat_id} failed!:{e}, {traceback.format_exc()}",
+                rate_limit_args=rate_limit_args,
+            )
+
+
+async def reply_streamed(
+    context, chat_id, sys_prompt, prompt, reply_to_message_id=None
+) -> str:
+    """
+    Streams an LLM reply into a placeholder message that is edited at most every
+    STREAM_EDIT_INTERVAL seconds, and publishes the reply to Telegraph instead
+    when it outgrows a Telegram message. When generating the reply fails, the
+    placeholder is edited to the error.
+
+    Returns:
+        str: The complete reply, or the part received before the error.
+    """
+    msg = await context.bot.send_message(
+        chat_id, "…", reply_to_message_id=reply_to_message_id
+    )
+    text = ""
+    shown = ""
+    last_edit = time.monotonic()
+    try:
+        async for delta in stream_chat_completion(sys_prompt, prompt):
+            text += delta
+            now = time.monotonic()
+            if (
+                now - last_edit >= STREAM_EDIT_INTERVAL
+                and len(text) <= TG_MESSAGE_LIMIT
+                and text.strip() != shown
+            ):
+                try:
+                    await msg.edit_text(text)
+                    shown = text.strip()
+                except telegram.error.TelegramError as e:
+                    logging.warning(f"streamed edit failed: {e}")
+                last_edit = now
+
+        rendered = telegramify_markdown.markdownify(text)
+        if len(rendered) <= TG_MESSAGE_LIMIT:
+            try:
+                await msg.edit_text(rendered, parse_mode="MarkdownV2")
+            except telegram.error.BadRequest as e:
+                logging.warning(f"markdown edit failed, keeping plain text: {e}")
+                if text.strip() != shown:
+                    await msg.edit_text(text)
+        else:
+            if not shown:
+                await msg.edit_text(text[: TG_MESSAGE_LIMIT - 1] + "…")
+            await send_telegraph(
+                context, chat_id, text, reply_to_message_id=msg.message_id
             )
+    except Exception as e:
+        # the placeholder must not stay behind, it turns into the error
+        logging.exception(f"streamed reply failed: {e}")
+        error = f"Failed to generate a reply. {e}"
+        try:
+            if text.strip() and len(text) + len(error) + 2 <= TG_MESSAGE_LIMIT:
+                await msg.edit_text(f"{text}\n\n{error}")
+            else:
+                await msg.edit_text(error)
+        except telegram.error.TelegramError:
+            await msg.delete()
+    return text
+
+
+async def send_tts_audio(bot, chat_id, text, filename, audio=None, **kwargs) -> None:
+    """
+    Sends the synthesized speech of a text, re-sending the Telegram file_id or
+    uploading the cached audio when the same text was synthesized before.
+
+    Parameters:
+        bot (telegram.Bot): The bot sending the audio.
+        chat_id (int): The target chat.
+        text (str): The text to speak.
+        filename (str): The file name shown for a new upload.
+        audio (bytes): Speech of the text that was already synthesized.
+        **kwargs: Passed on to send_audio.
+    """
+    key = TTSCache.make_key(VOICE, text)
+    file_id, cached_audio = (
+        await asyncio.to_thread(tts_cache.get, key) if tts_cache else (None, None)
+    )
+    audio = audio or cached_audio
+    if file_id:
+        try:
+            await bot.send_audio(chat_id, audio=file_id, **kwargs)
+            return
+        except telegram.error.BadRequest as e:
+            logging.warning(f"cached audio {file_id} rejected, uploading again: {e}")
 
+    if audio is None:
+        audio = await gen_tts_audio_chunked(text)
+    # prebuilt reminder audio is stored too, so its file_id has a row to go to
+    if tts_cache and cached_audio is None:
+        await asyncio.to_thread(tts_cache.put_audio, key, audio)
 
-async def send_audio(context, job, llm_response, words):
+    msg = await bot.send_audio(chat_id, audio=audio, filename=filename, **kwargs)
+    if tts_cache and msg.audio:
+        await asyncio.to_thread(tts_cache.put_file_id, key, msg.audio.file_id)
+
+
+async def send_audio(context, chat_id, audio_task, words):
     try:
-        audio_filename = f"vocabulary-{datetime.datetime.now(datetime.UTC)}.mp3"
-        await gen_tts_audio(
-            text=markdown_to_text(llm_response), filename=audio_filename
+        text, audio = await audio_task
+        await send_tts_audio(
+            context.bot,
+            chat_id,
+            text,
+            f"vocabulary-{datetime.datetime.now(datetime.UTC):%Y%m%d-%H%M}.mp3",
+            audio=audio,
+            caption=", ".join(words),
+            rate_limit_args=BULK,
         )
-        await context.bot.send_audio(
-            job.chat_id, audio=audio_filename, caption=f"{", ".join(words)}"
-        )
-        os.remove(audio_filename)
     except Exception as e:
         await context.bot.send_message(
-            job.chat_id,
-            f"{job.name} {job.data} audio failed!:{e}, {traceback.format_exc()}",
+            chat_id,
+            f"{chat_id} audio failed!:{e}, {traceback.format_exc()}",
+            rate_limit_args=BULK,
         )
 
 
@@ -228,147 +410,523 @@ def get_random_subarray_weighted(words: list, subarray_size: int = 15) -> list:
     return words[start_index : start_index + subarray_size]
 
 
+def _word_digest(word: str) -> str:
+    return hashlib.sha256(word.encode()).hexdigest()[:16]
+
+
+def word_callback_data(action: str, word: str) -> str:
+    """
+    Builds the callback data of a word button, "action:word", or
+    "action:#digest" when the word does not fit into TG_CALLBACK_DATA_LIMIT.
+    """
+    data = f"{action}:{word}"
+    if len(data.encode()) <= TG_CALLBACK_DATA_LIMIT:
+        return data
+    return f"{action}:#{_word_digest(word)}"
+
+
+def resolve_callback_word(payload: str) -> str | None:
+    """
+    Returns the word of the callback data built by word_callback_data, None
+    for a digest of a word that is no longer in the study list.
+    """
+    if not payload.startswith("#"):
+        return payload
+    # only words of the study list get buttons, so the digest is found there
+    digest = payload[1:]
+    for w in vocabulary_store.words():
+        if _word_digest(w["word"].strip()) == digest:
+            return w["word"].strip()
+    return None
+
+
+def gen_word_keyboard(*words: str) -> InlineKeyboardMarkup:
+    """
+    Builds the inline buttons of word cards: review grades for the spaced
+    repetition scheduler and removal from the study list. A message packing
+    several cards gets one row per word, led by its removal button.
+    """
+    if len(words) > 1:
+        return InlineKeyboardMarkup(
+            [
+                [
+                    InlineKeyboardButton(
+                        text=f"✖ {word}",
+                        callback_data=word_callback_data("remove", word),
+                    )
+                ]
+                + [
+                    InlineKeyboardButton(
+                        text=grade.capitalize(),
+                        callback_data=word_callback_data(grade, word),
+                    )
+                    for grade in (GRADES if SRS_ENABLED else ())
+                ]
+                for word in words
+            ]
+        )
+    (word,) = words
+    # 创建 InlineKeyboardButton 并设置回调数据
+    rows = [
+        [
+            InlineKeyboardButton(
+                text=f"Remove {word}", callback_data=word_callback_data("remove", word)
+            )
+        ]
+    ]
+    if SRS_ENABLED:
+        rows.insert(
+            0,
+            [
+                InlineKeyboardButton(
+                    text=grade.capitalize(),
+                    callback_data=word_callback_data(grade, word),
+                )
+                for grade in GRADES
+            ],
+        )
+    return InlineKeyboardMarkup(rows)
+
+
+async def review_word_button(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> None:
+    query = update.callback_query
+    grade, word = query.data.split(":", 1)
+    word = resolve_callback_word(word)
+    if word is None:
+        await query.answer("word no longer in the study list")
+        return
+    state = review_scheduler.review(word, grade)
+    if state is None:
+        await query.answer(f"Not in the study list : {word}")
+        return
+    await review_scheduler.save()
+    await query.answer(f"{word} : next review in {state.interval:g} day(s)")
+
+
 async def remove_word_button(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
     query = update.callback_query
-    # 获取按钮携带的动态数据
-    dynamic_text = query.data
+    # 获取按钮携带的动态数据, buttons sent before the review buttons carry the bare word
+    dynamic_text = resolve_callback_word(query.data.removeprefix("remove:"))
+    if dynamic_text is None:
+        await query.answer("word no longer in the study list")
+        return
     payload = {"id": "0", "language": "en", "words": [dynamic_text]}
     success = await remove_words_from_eudic(payload)
     # 向用户发送包含动态数据的消息
     if success:
+        await vocabulary_store.remove([dynamic_text])
+        review_scheduler.remove([dynamic_text])
         await query.answer(f"Removed : {dynamic_text}")
     else:
         await query.answer(f"Removed failed : {dynamic_text}")
 
 
-async def callback_message(context: telegram.ext.CallbackContext) -> None:
-    """Send the alarm message."""
-    job = context.job
-    logging.info(context.job)
+async def explain_batch(words: list, semaphore: asyncio.Semaphore) -> dict:
+    """
+    Explains several words with one JSON reply per LLM call, asking again only
+    for the words that are missing or malformed.
+
+    Parameters:
+        words (list): The words to explain.
+        semaphore (asyncio.Semaphore): Limits how many LLM calls run at once.
+
+    Returns:
+        dict: The Markdown explanation of each lowercased word that succeeded.
+    """
+    explanations = {}
+    async with semaphore:
+        original_exps = {word: await aquery_text_from_mdx(word) for word in words}
+        for attempt in range(EXPLAIN_BATCH_RETRIES + 1):
+            pending = [w for w in words if w.lower() not in explanations]
+            if not pending:
+                break
+            prompt = json.dumps(
+                [
+                    {"word": w, "original explanation": original_exps[w]}
+                    for w in pending
+                ],
+                ensure_ascii=False,
+            )
+            try:
+                result = await gen_json_completion(
+                    sys_message_explanation_batch, prompt
+                )
+            except Exception as e:
+                logging.exception(f"batch explanation {attempt=} failed: {e}")
+                continue
+            for key, value in result.items():
+                if isinstance(value, str) and value.strip():
+                    explanations[key.strip().lower()] = value
+            logging.info(
+                f"batch explanation {attempt=}: {len(pending)=}, {result.keys()=}"
+            )
+    return explanations
+
+
+async def build_word_card(
+    i: int, w: dict, semaphore: asyncio.Semaphore, batch: asyncio.Task = None
+) -> tuple:
+    """
+    Looks up and explains a single chosen word.
+
+    Parameters:
+        i (int): The position of the word in the reminder.
+        w (dict): The Eudic study list entry of the word.
+        semaphore (asyncio.Semaphore): Limits how many words are explained at once.
+        batch (asyncio.Task): A running explain_batch covering the word, the word
+            is explained on its own when the batch has no explanation for it.
+
+    Returns:
+        tuple: The word and its card rendered as MarkdownV2.
+    """
+    word = w.get("word", "").strip()
+    explanations = await batch if batch else {}
+    async with semaphore:
+        # query mdict
+        original_exp = await aquery_text_from_mdx(word)
+        # llm explain
+        llm_explain = explanations.get(word.lower())
+        if not llm_explain:
+            llm_explain = await gen_chat_completion(
+                sys_message_explanation,
+                f'word: "{word}", original explanation: \n```{original_exp}```',
+            )
+    return word, render_word_card(i, w, word, original_exp, llm_explain)
+
+
+async def send_packed(context, chat_id, text: str, words: list) -> None:
+    """Sends one packed MarkdownV2 message, as plain text if Telegram rejects it."""
+    keyboard = gen_word_keyboard(*words) if words else None
+    try:
+        await context.bot.send_message(
+            chat_id,
+            text,
+            parse_mode="MarkdownV2",
+            reply_markup=keyboard,
+            rate_limit_args=BULK,
+        )
+    except telegram.error.BadRequest as e:
+        logging.warning(f"packed message rejected, sending it as plain text: {e}")
+        await context.bot.send_message(
+            chat_id, text, reply_markup=keyboard, rate_limit_args=BULK
+        )
+
+
+async def send_word_cards(context, chat_id, choice: list, cards: list) -> None:
+    """
+    Drains the word cards to the chat in their original order, packing
+    consecutive cards into as few messages as fit TG_MESSAGE_LIMIT. A message
+    is sent as soon as the next card does not fit into it, and carries the
+    buttons of the words whose cards end in it.
+    """
+    packer = MessagePacker(TG_MESSAGE_LIMIT)
+    for w, card in zip(choice, cards):
+        try:
+            word, text = await card
+            for message, words in packer.add(text, word):
+                await send_packed(context, chat_id, message, words)
+        except Exception as e:
+            logging.exception(e)
+            # keep the order, the cards before the failed one go out first
+            for message, words in packer.flush():
+                await send_packed(context, chat_id, message, words)
+            await context.bot.send_message(
+                chat_id,
+                f"explain {w} failed!:{e}, {traceback.format_exc()}",
+                rate_limit_args=BULK,
+            )
+            continue
+    for message, words in packer.flush():
+        await send_packed(context, chat_id, message, words)
+
+
+@dataclasses.dataclass
+class ReminderBundle:
+    """The content of one reminder, generated by tasks that can run ahead of delivery."""
+
+    choice: list
+    words: list
+    cards: list
+    essay: asyncio.Task
+    article_url: asyncio.Task
+    audio: asyncio.Task
+
+    def tasks(self) -> list:
+        return [*self.cards, self.essay, self.article_url, self.audio]
+
+    def cancel(self) -> None:
+        for task in self.tasks():
+            task.cancel()
+
+    def failed(self) -> bool:
+        """Whether the essay or a word card failed to generate."""
+        return any(
+            task.done() and not task.cancelled() and task.exception() is not None
+            for task in [*self.cards, self.essay]
+        )
+
+
+# caps the reminders of all chats that generate content at the same time
+reminder_build_semaphore = asyncio.Semaphore(REMINDER_BUILD_CONCURRENCY)
+
+
+async def choose_words() -> list:
+    """Chooses the study list entries of the next reminder."""
     # get vocabulary
-    vocabulary = await list_eudic_vocabulary(0, 0)
+    vocabulary = vocabulary_store.words()
     if not vocabulary:
-        await context.bot.send_message(job.chat_id, f"not words")
-        return
+        # nothing mirrored yet, only happens before the first sync finishes
+        await vocabulary_store.reconcile()
+        vocabulary = vocabulary_store.words()
+        review_scheduler.sync([w["word"] for w in vocabulary])
+    if not vocabulary:
+        return []
 
     # choose words
     k = CHOSEN_WORDS_SIZE
 
-    choice = get_random_subarray_weighted(vocabulary, k)
-    words = format_words(choice)
-    # send words
-    try:
-        for i, w in enumerate(choice, 1):
-            try:
-                word = w.get("word", "").strip()
-                l = gen_word_links(i, w, word)
-                msg = await context.bot.send_message(
-                    job.chat_id,
-                    re.sub(r"\n+", "\n", telegramify_markdown.convert(l))[:4096],
-                    parse_mode="MarkdownV2",
-                )
+    if SRS_ENABLED:
+        choice = [w for w in map(vocabulary_store.get, review_scheduler.select(k)) if w]
+        await review_scheduler.save()
+    else:
+        choice = get_random_subarray_weighted(vocabulary, k)
+    return choice
 
-                # query mdict
-                original_exp = query_text_from_mdx(word)
-                # llm explain
-                llm_explain = await gen_chat_completion(
-                    sys_message_explanation,
-                    f'word: "{word}", original explanation: \n```{original_exp}```',
-                )
 
-                # inline button
-                # 创建 InlineKeyboardButton 并设置回调数据
-                button = InlineKeyboardButton(text=f"Remove {word}", callback_data=word)
-                keyboard = InlineKeyboardMarkup([[button]])
-
-                await context.bot.send_message(
-                    job.chat_id,
-                    telegramify_markdown.convert(llm_explain),
-                    parse_mode="MarkdownV2",
-                    reply_to_message_id=msg.message_id,
-                    reply_markup=keyboard,
-                )
-                await asyncio.sleep(MESSAGE_SEND_INTERVAL)
+def build_reminder(choice: list) -> ReminderBundle:
+    """
+    Starts generating all content of a reminder: the word cards, the essay,
+    its Telegraph page and its audio.
+    """
+    words = format_words(choice)
 
-            except Exception as e:
-                logging.exception(e)
-                await context.bot.send_message(
-                    job.chat_id,
-                    f"explain {w} failed!:{e}, {traceback.format_exc()}",
-                )
-                continue
+    # look up and explain all words concurrently, the essay overlaps with them
+    semaphore = asyncio.Semaphore(EXPLAIN_CONCURRENCY)
+    batches = {}
+    if EXPLAIN_BATCH_SIZE > 0:
+        for start in range(0, len(choice), EXPLAIN_BATCH_SIZE):
+            batch_words = [
+                w.get("word", "").strip()
+                for w in choice[start : start + EXPLAIN_BATCH_SIZE]
+            ]
+            batch = asyncio.create_task(explain_batch(batch_words, semaphore))
+            batches.update(dict.fromkeys(batch_words, batch))
+    cards = [
+        asyncio.create_task(
+            build_word_card(i, w, semaphore, batches.get(w.get("word", "").strip()))
+        )
+        for i, w in enumerate(choice, 1)
+    ]
+    # llm generate article
+    essay = asyncio.create_task(
+        gen_chat_completion(sys_message_writer, f"words: \n{words}")
+    )
 
-        # llm generate article
-        llm_response = await gen_chat_completion(
-            sys_message_writer, f"words: \n{words}"
+    async def publish() -> str:
+        return await write_to_telegraph(
+            await run_blocking(markdown_to_html, await essay)
         )
 
+    async def synthesize() -> tuple:
+        text = await amarkdown_to_speech(await essay, TTS_INCLUDE_EXPLANATION)
+        # a text spoken before is sent from the cache, by file_id or its audio
+        if tts_cache:
+            key = TTSCache.make_key(VOICE, text)
+            file_id, audio = await asyncio.to_thread(tts_cache.get, key)
+            if file_id or audio:
+                return text, audio
+        return text, await gen_tts_audio_chunked(text)
+
+    return ReminderBundle(
+        choice,
+        words,
+        cards,
+        essay,
+        asyncio.create_task(publish()),
+        asyncio.create_task(synthesize()),
+    )
+
+
+async def deliver_reminder(context, chat_id: int, bundle: ReminderBundle) -> None:
+    """Sends a reminder, waiting for whatever content is not generated yet."""
+    # send words
+    try:
+        await send_word_cards(context, chat_id, bundle.choice, bundle.cards)
+
+        llm_response = await bundle.essay
+
         logging.debug(llm_response)
         # send telegraph
-        await send_telegraph(context, job.chat_id, llm_response)
-        # gen audio file
-        await send_audio(context, job, llm_response, words)
+        try:
+            await context.bot.send_message(
+                chat_id, await bundle.article_url, rate_limit_args=BULK
+            )
+        except Exception as e:
+            logging.exception(e)
+            await send_telegraph(context, chat_id, llm_response, rate_limit_args=BULK)
+        # send audio
+        await send_audio(context, chat_id, bundle.audio, bundle.words)
 
     except Exception as e:
         logging.exception(e)
         await context.bot.send_message(
-            job.chat_id, f"{job.name} {job.data} failed!:{e}, {traceback.format_exc()}"
+            chat_id,
+            f"{chat_id} reminder failed: {e}",
+            rate_limit_args=BULK,
         )
+    finally:
+        bundle.cancel()
+
+
+@timed("reminder", "prebuild")
+async def prebuild_reminder(context: telegram.ext.CallbackContext) -> None:
+    """Generate the next reminder of a chat ahead of its delivery time."""
+    job = context.job
+    bundles = context.bot_data.setdefault("bundles", {})
+    async with reminder_build_semaphore:
+        choice = await choose_words()
+        if not choice:
+            return
+        bundle = build_reminder(choice)
+        stale = bundles.pop(job.chat_id, None)
+        if stale is not None:
+            stale.cancel()
+        bundles[job.chat_id] = bundle
+        await asyncio.wait(bundle.tasks())
+    # retrieved here, a bundle can be replaced or dropped before it is delivered
+    errors = [
+        task.exception()
+        for task in bundle.tasks()
+        if not task.cancelled() and task.exception() is not None
+    ]
+    if errors:
+        logging.warning(f"reminder of {job.chat_id} prebuilt with errors: {errors}")
+        return
+    logging.info(f"reminder of {job.chat_id} prebuilt: {bundle.words}")
+
+
+@timed("reminder", "deliver")
+async def callback_message(context: telegram.ext.CallbackContext) -> None:
+    """Send the alarm message."""
+    job = context.job
+    logging.info(context.job)
+    bundle = context.bot_data.get("bundles", {}).pop(job.chat_id, None)
+    if bundle is not None and not bundle.failed():
+        # generated ahead by prebuild_reminder, only the sends are left
+        await deliver_reminder(context, job.chat_id, bundle)
+        return
+
+    async with reminder_build_semaphore:
+        if bundle is not None:
+            # the prebuild failed, e.g. during an LLM outage, so try it live
+            logging.warning(f"prebuilt reminder of {job.chat_id} failed, rebuilding")
+            bundle.cancel()
+            choice = bundle.choice
+        else:
+            choice = await choose_words()
+        if not choice:
+            await context.bot.send_message(
+                job.chat_id, f"not words", rate_limit_args=BULK
+            )
+            return
+        await deliver_reminder(context, job.chat_id, build_reminder(choice))
+
+
+def remove_reminders(job_queue, chat_id: int) -> None:
+    """Removes the reminder jobs of one chat, leaving other chats' jobs alone."""
+    for job in job_queue.jobs():
+        if job.chat_id == chat_id and job.callback in (
+            callback_message,
+            prebuild_reminder,
+        ):
+            job.schedule_removal()
+    bundle = job_queue.application.bot_data.get("bundles", {}).pop(chat_id, None)
+    if bundle is not None:
+        bundle.cancel()
+
+
+def schedule_reminders(job_queue, chat_id: int, schedule: dict) -> None:
+    """Registers the daily reminder jobs of a stored chat schedule."""
+    remove_reminders(job_queue, chat_id)
+    tz = pytz.timezone(schedule["tz"])
+    for h, m in schedule["times"]:
+        job_queue.run_daily(
+            callback_message,
+            datetime.time(hour=h, minute=m, tzinfo=tz),
+            name=f"{chat_id} {h}:{m} job",
+            chat_id=chat_id,
+        )
+        if PREBUILD_LEAD_MINUTES > 0:
+            prebuild_at = datetime.datetime.combine(
+                datetime.date.today(), datetime.time(hour=h, minute=m)
+            ) - datetime.timedelta(minutes=PREBUILD_LEAD_MINUTES)
+            job_queue.run_daily(
+                prebuild_reminder,
+                prebuild_at.time().replace(tzinfo=tz),
+                name=f"{chat_id} {h}:{m} prebuild",
+                chat_id=chat_id,
+            )
 
 
 @allowed_users_only
 async def set_timer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Add a job to the queue."""
+    """Add a job to the queue, /set [timezone] e.g. /set Europe/London."""
 
+    chat_id = update.message.chat_id
+    tz = context.args[0] if context.args else REMINDER_TIMEZONE
+    if tz not in pytz.all_timezones_set:
+        await update.effective_message.reply_text(f"Unknown timezone: {tz}")
+        return
     try:
-        for job in context.job_queue.jobs():
-            job.schedule_removal()
-    except Exception as e:
-        logging.error(f"remove all jobs failed: {e}")
-    try:
+        times = schedule_store.spread_times(chat_id, tz)
+        schedule_store.set(chat_id, tz, times)
+        schedule_reminders(context.job_queue, chat_id, {"tz": tz, "times": times})
+
         context.job_queue.run_once(
             callback_message,
-            datetime.datetime.now(tz=pytz.timezone("Asia/Shanghai"))
-            + datetime.timedelta(seconds=1),
-            name="once1",
-            chat_id=update.message.chat_id,
-        )
-
-        times = [(x, random.randint(15, 55)) for x in [8, 9, 12, 19, 20, 21]]
-        for h, m in times:
-            context.job_queue.run_daily(
-                callback_message,
-                datetime.time(hour=h, minute=m, tzinfo=pytz.timezone("Asia/Shanghai")),
-                name=f"{h}:{m} job",
-                chat_id=update.message.chat_id,
-            )
+            datetime.datetime.now(tz=pytz.timezone(tz)) + datetime.timedelta(seconds=1),
+            name=f"{chat_id} once",
+            chat_id=chat_id,
+        )
 
-        text = "Timer successfully set!"
-        await update.effective_message.reply_text(text)
+        text = "Timer successfully set! " + ", ".join(
+            f"{h:02}:{m:02}" for h, m in times
+        )
+        await update.effective_message.reply_text(f"{text} ({tz})")
 
     except (IndexError, ValueError) as e:
         logging.exception(e)
         await update.effective_message.reply_text(str(e))
 
 
+@allowed_users_only
+async def unset_timer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Remove the reminders of the chat."""
+    chat_id = update.message.chat_id
+    remove_reminders(context.job_queue, chat_id)
+    schedule_store.remove(chat_id)
+    await update.effective_message.reply_text("Timer successfully removed!")
+
+
 # Define the function to handle the /audio command
 async def get_audio_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         all_words = " ".join(context.args).strip()
         audio_url = f"https://dict.youdao.com/dictvoice?audio={quote(all_words)}&type=2"
-        audio_filename = (
-            f"audio-{datetime.datetime.now(datetime.UTC)}-{all_words[:30]}.mp3"
-        )
         await update.effective_message.reply_text(
             audio_url, reply_to_message_id=update.message.message_id
         )
-        await gen_tts_audio(text=all_words, filename=audio_filename)
-        await update.effective_message.reply_audio(
-            audio=audio_filename, reply_to_message_id=update.message.message_id
+        await send_tts_audio(
+            context.bot,
+            update.effective_message.chat_id,
+            all_words,
+            f"audio-{all_words[:30]}.mp3",
+            reply_to_message_id=update.message.message_id,
         )
-        os.remove(audio_filename)
     except (IndexError, ValueError) as e:
         logging.exception(e)
         await update.effective_message.reply_text(f"IndexError, ValueError: {e}")
@@ -383,9 +941,10 @@ async def get_audio_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def get_web_definition_url(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         word = " ".join(context.args).strip()
-        page_urls = gen_word_links(0, {}, word)
+        original_exp = await aquery_text_from_mdx(word)
+        page_urls = gen_word_links(0, {}, word, original_exp)
         msg = await update.effective_message.reply_text(
-            telegramify_markdown.convert(page_urls),
+            telegramify_markdown.markdownify(page_urls),
             parse_mode="MarkdownV2",
             reply_to_message_id=update.message.message_id,
         )
@@ -396,14 +955,11 @@ async def get_web_definition_url(update: Update, context: ContextTypes.DEFAULT_T
         )
     else:
         # llm explain
-        original_exp = query_text_from_mdx(word)
-        llm_explain = await gen_chat_completion(
+        await reply_streamed(
+            context,
+            update.effective_message.chat_id,
             sys_message_explanation,
             f'word: "{word}, original explanation: \n```{original_exp}```"',
-        )
-        await update.effective_message.reply_text(
-            telegramify_markdown.convert(llm_explain),
-            parse_mode="MarkdownV2",
             reply_to_message_id=msg.message_id,
         )
 
@@ -428,6 +984,8 @@ async def add_words(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         response_json = await add_words_to_eudic(payload)
+        await vocabulary_store.add(words)
+        review_scheduler.add(words)
         message = response_json.get("message", "Words added successfully!")
         await update.message.reply_text(
             message, reply_to_message_id=update.message.message_id
@@ -439,13 +997,11 @@ async def add_words(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     else:
         # llm explain
-        llm_explain = await gen_chat_completion(
-            sys_message_explanation, f'explain all these words: "{words}"'
-        )
-        await send_telegraph(
+        await reply_streamed(
             context,
             update.message.chat_id,
-            llm_explain,
+            sys_message_explanation,
+            f'explain all these words: "{words}"',
             reply_to_message_id=update.message.message_id,
         )
 
@@ -471,6 +1027,8 @@ async def remove_words(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         success = await remove_words_from_eudic(payload)
         if success:
+            await vocabulary_store.remove(words)
+            review_scheduler.remove(words)
             await update.message.reply_text(
                 "Words removed successfully!",
                 reply_to_message_id=update.message.message_id,
@@ -489,23 +1047,22 @@ async def remove_words(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 @allowed_users_only
 async def send_jina_ai_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    source_url = context.args[0]
+    source_url = context.args[0] if context.args else ""
     if not source_url:
         await update.message.reply_text(f"empty url")
         return
-    content = await fetch_markdown_from_url(source_url)
     try:
-        # send telegraph
-        await send_telegraph(
-            context,
-            update.message.chat_id,
-            content,
-            reply_to_message_id=update.message.message_id,
+        # send telegraph, a cached article is answered without fetching it
+        page_url = await publish_article(
+            source_url, fallback=telegramify_markdown.markdownify
+        )
+        await update.message.reply_text(
+            page_url, reply_to_message_id=update.message.message_id
         )
     except Exception as e:
         logging.exception("failed", exc_info=True)
         await update.message.reply_text(
-            f"Failed to add words. Please try again later. {e}"
+            f"Failed to publish {source_url}. Please try again later. {e}"
         )
 
 
@@ -515,7 +1072,7 @@ async def query_mdict(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not word:
             await update.message.reply_text("Please provide a word to query.")
             return
-        definition = query_text_from_mdx(word)
+        definition = await aquery_text_from_mdx(word)
         await update.message.reply_text(
             definition, reply_to_message_id=update.message.message_id
         )
@@ -534,13 +1091,11 @@ async def chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         # llm explain
-        llm_explain = await gen_chat_completion(
-            "You are a helpful assistant. ", f'Answer the question: "{user_message}"'
-        )
-        await send_telegraph(
+        await reply_streamed(
             context,
             update.message.chat_id,
-            llm_explain,
+            "You are a helpful assistant. ",
+            f'Answer the question: "{user_message}"',
             reply_to_message_id=update.message.message_id,
         )
     except Exception as e:
@@ -548,24 +1103,149 @@ async def chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"Failed to chat. {e}")
 
 
+async def sync_vocabulary(context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        await vocabulary_store.reconcile()
+        review_scheduler.sync([w["word"] for w in vocabulary_store.words()])
+        await review_scheduler.save()
+    except Exception as e:
+        logging.exception(f"vocabulary sync failed: {e}")
+
+
+# imported in the background after startup, the handlers import them on first use
+LAZY_MODULES = ["openai", "edge_tts", "telegraph.utils", "mistune", "bs4"]
+
+
+async def warm_up(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Runs once the bot takes updates: logs the startup report, then loads the
+    dictionary, the slow imports and the Telegraph accounts ahead of first use.
+    """
+    startup_report.record("taking updates after", process_age())
+    startup_report.log()
+    phases = {
+        "dictionary": lambda: run_blocking(load_dictionary),
+        "imports": lambda: asyncio.to_thread(
+            lambda: [importlib.import_module(m) for m in LAZY_MODULES]
+        ),
+        "llm clients": lambda: asyncio.to_thread(
+            lambda: [provider.client for provider in router.providers]
+        ),
+        "telegraph accounts": telegraph_publisher.ensure_accounts,
+    }
+    for name, phase in phases.items():
+        try:
+            with warm_up_report.phase(name):
+                await phase()
+        except Exception as e:
+            logging.exception(f"warm-up of {name} failed: {e}")
+    warm_up_report.log()
+
+
+async def post_init(application: Application) -> None:
+    """Set up shared resources once the application is initialized."""
+    logging.info(f"llm providers: {[p.name for p in router.providers]}")
+    with startup_report.phase("http clients"):
+        await init_http_clients()
+    with startup_report.phase("stores"):
+        vocabulary_store.load()
+        review_scheduler.load()
+        review_scheduler.sync([w["word"] for w in vocabulary_store.words()])
+    # restore the reminders of every chat
+    with startup_report.phase("schedules"):
+        schedule_store.load()
+        for chat_id, schedule in schedule_store.items():
+            schedule_reminders(application.job_queue, chat_id, schedule)
+    # the job queue starts right after the updater, when updates are taken
+    application.job_queue.run_once(warm_up, 0, name="warm-up")
+    # reconcile the local study list with Eudic in the background
+    application.job_queue.run_repeating(
+        sync_vocabulary, interval=VOCABULARY_SYNC_INTERVAL, first=1, name="sync"
+    )
+    if METRICS_PORT:
+        try:
+            application.bot_data["metrics_server"] = await start_metrics_server(
+                METRICS_HOST, METRICS_PORT
+            )
+        except OSError as e:
+            # the bot works without its metrics, e.g. when the port is taken
+            logging.error(f"metrics server on {METRICS_HOST}:{METRICS_PORT}: {e}")
+
+
+async def post_shutdown(application: Application) -> None:
+    """Release shared resources after the application has shut down."""
+    await close_http_clients()
+    shutdown_executor()
+    metrics_server = application.bot_data.pop("metrics_server", None)
+    if metrics_server is not None:
+        metrics_server.close()
+        await metrics_server.wait_closed()
+    logging.info(f"llm provider stats: {provider_stats()}")
+
+
 def main() -> None:
     """Run bot."""
+    startup_report.record("interpreter and imports", process_age())
+    if MESSAGE_SEND_INTERVAL:
+        logging.warning(
+            "MESSAGE_SEND_INTERVAL is no longer used, sends are paced by "
+            "TG_OVERALL_RATE, TG_CHAT_RATE and TG_GROUP_RATE_PER_MINUTE"
+        )
+    build_started = time.perf_counter()
     # Create the Application and pass it your bot's token.
-    application = Application.builder().token(TG_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TG_BOT_TOKEN)
+        .base_url(TG_BASE_URL)
+        .base_file_url(TG_BASE_FILE_URL)
+        .rate_limiter(
+            PriorityRateLimiter(
+                TG_OVERALL_RATE, TG_CHAT_RATE, TG_GROUP_RATE_PER_MINUTE, TG_MAX_RETRIES
+            )
+        )
+        .concurrent_updates(UserLaneUpdateProcessor(UPDATE_CONCURRENCY))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
+    # every handler is timed as a stage, whether or not it checks the user
+    timed_handler = timed("handler")
     # on different commands - answer in Telegram
-    application.add_handler(CommandHandler("set", set_timer))
-    application.add_handler(CommandHandler("define", get_web_definition_url))
-    application.add_handler(CommandHandler("audio", get_audio_url))
-    application.add_handler(CommandHandler("add", add_words))
-    application.add_handler(CommandHandler("remove", remove_words))
-    application.add_handler(CommandHandler("jina", send_jina_ai_page))
-    application.add_handler(CommandHandler("mdict", query_mdict))
-    application.add_handler(CommandHandler("chat", chat))
-    application.add_handler(CallbackQueryHandler(remove_word_button))
+    application.add_handler(CommandHandler("set", timed_handler(set_timer)))
+    application.add_handler(CommandHandler("unset", timed_handler(unset_timer)))
+    application.add_handler(
+        CommandHandler("define", timed_handler(get_web_definition_url))
+    )
+    application.add_handler(CommandHandler("audio", timed_handler(get_audio_url)))
+    application.add_handler(CommandHandler("add", timed_handler(add_words)))
+    application.add_handler(CommandHandler("remove", timed_handler(remove_words)))
+    application.add_handler(CommandHandler("jina", timed_handler(send_jina_ai_page)))
+    application.add_handler(CommandHandler("mdict", timed_handler(query_mdict)))
+    application.add_handler(CommandHandler("chat", timed_handler(chat)))
+    application.add_handler(
+        CallbackQueryHandler(
+            timed_handler(review_word_button), pattern=f"^({'|'.join(GRADES)}):"
+        )
+    )
+    application.add_handler(CallbackQueryHandler(timed_handler(remove_word_button)))
+    startup_report.record("application", time.perf_counter() - build_started)
 
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if TG_WEBHOOK_URL:
+        # a random secret is fine, the webhook is registered again on every start
+        secret_token = TG_WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        application.run_webhook(
+            listen=TG_WEBHOOK_LISTEN,
+            port=TG_WEBHOOK_PORT,
+            url_path=TG_WEBHOOK_PATH,
+            webhook_url=f"{TG_WEBHOOK_URL.rstrip('/')}/{TG_WEBHOOK_PATH.lstrip('/')}",
+            secret_token=secret_token,
+            max_connections=TG_WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,17 @@
+import functools
+import logging
 import os
+import sys
+import threading
+from typing import TYPE_CHECKING
 
-from bs4 import BeautifulSoup
-from mdict_query import mdict_query
+from config import MDICT_STORE_PATH, MDICT_LRU_SIZE
+from dict_store import PlaintextDictStore
+from metrics import timed
+from offload import run_blocking
+
+if TYPE_CHECKING:
+    from mdict_query import mdict_query
 
 # Get the current project directory
 project_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,20 +22,94 @@ static_dir = os.path.join(project_dir, "static")
 # Construct the path to the dictionary file
 dictionary_file = os.path.join(static_dir, "MerriamWebsterV3.mdx")
 
-# Create the IndexBuilder instance
-builder = mdict_query.IndexBuilder(dictionary_file)
+# Construct the path to the plaintext store, built with `python mdict.py build`
+store_path = MDICT_STORE_PATH or os.path.join(static_dir, "MerriamWebsterV3")
+
+
+def cache_once(func):
+    """
+    Caches the result of a function without arguments like functools.cache,
+    except that concurrent first calls from the offload pool wait for the one
+    running instead of doing the expensive work again.
+    """
+    lock = threading.Lock()
+    cached = functools.cache(func)
+
+    @functools.wraps(func)
+    def wrapper():
+        with lock:
+            return cached()
+
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+
+@cache_once
+def get_builder() -> "mdict_query.IndexBuilder":
+    from mdict_query import mdict_query
+
+    # Create the IndexBuilder instance
+    return mdict_query.IndexBuilder(dictionary_file)
+
+
+@cache_once
+def get_store() -> PlaintextDictStore | None:
+    if not PlaintextDictStore.exists(store_path):
+        logging.info(f"no plaintext store at {store_path}, querying {dictionary_file}")
+        return None
+    return PlaintextDictStore.open(store_path)
+
+
+def load_dictionary() -> None:
+    """Opens the plaintext store, or builds the .mdx index without one."""
+    if get_store() is None:
+        get_builder()
 
 
 def html_to_text(html):
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html, "html.parser")
     text = soup.get_text(separator="\n")
     return text
 
 
-def query_text_from_mdx(keyword):
-    html = builder.mdx_lookup(keyword, ignorecase=True)
+def lookup_text_from_mdx(keyword):
+    html = get_builder().mdx_lookup(keyword, ignorecase=True)
     return html_to_text("\n".join(html)) if html else ""
 
 
+@functools.lru_cache(maxsize=MDICT_LRU_SIZE)
+def query_text_from_mdx(keyword):
+    store = get_store()
+    if store is not None:
+        return store.lookup(keyword)
+    return lookup_text_from_mdx(keyword)
+
+
+@timed("mdict", "lookup")
+async def aquery_text_from_mdx(keyword):
+    """Runs query_text_from_mdx in the offload pool"""
+    return await run_blocking(query_text_from_mdx, keyword)
+
+
+def build_plaintext_store() -> int:
+    """
+    Converts every headword of the .mdx dictionary to plaintext and writes
+    the precompiled store used by query_text_from_mdx.
+
+    Returns:
+        int: The number of headwords written.
+    """
+    # case variants of a headword share one ignorecase lookup
+    keys = dict.fromkeys(key.lower() for key in get_builder().get_mdx_keys())
+    return PlaintextDictStore.build(
+        ((key, lookup_text_from_mdx(key)) for key in keys), store_path
+    )
+
+
 if __name__ == "__main__":
-    print(query_text_from_mdx("vigorous"))
+    if sys.argv[1:] == ["build"]:
+        print(f"{build_plaintext_store()} headwords written to {store_path}")
+    else:
+        print(query_text_from_mdx("vigorous"))
@@ -0,0 +1,171 @@
+import itertools
+import re
+
+# inline markers of MarkdownV2, the longer ones are matched first
+MARKERS = ("||", "__", "*", "_", "~")
+FENCE = "```"
+# the characters break_points has to look at, everything else is skipped
+SPECIAL = re.compile(r"[\\\n `\[\]()*_~|]")
+
+
+def utf16_len(text: str) -> int:
+    """Returns the length of a text as Telegram counts it, in UTF-16 code units."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def break_points(text: str) -> list[tuple[int, int, str | None]]:
+    """
+    Finds the positions where a MarkdownV2 text can be split without cutting
+    an entity or an escape sequence.
+
+    Returns:
+        list: (position, priority, fence) of each newline or space outside the
+            inline entities, priority 0 for newlines and 1 for spaces. Newlines
+            inside a code block carry its opening fence, which has to be closed
+            before and reopened after the split.
+    """
+    points = []
+    open_markers = set()
+    fence = None
+    inline_code = link_text = link_url = False
+    i = 0
+    while match := SPECIAL.search(text, i):
+        i = match.start()
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if fence is not None:
+            if text.startswith(FENCE, i):
+                fence = None
+                i += len(FENCE)
+                continue
+            if c == "\n":
+                points.append((i, 0, fence))
+        elif inline_code:
+            inline_code = c != "`"
+        elif link_url:
+            link_url = c != ")"
+        elif text.startswith(FENCE, i):
+            end = text.find("\n", i)
+            end = len(text) if end == -1 else end
+            fence = text[i:end]
+            # a split right after the opening fence would leave an empty block
+            i = end + 1
+            continue
+        elif c == "`":
+            inline_code = True
+        elif c == "[":
+            link_text = True
+        elif c == "]" and link_text:
+            link_text = False
+            if text.startswith("(", i + 1):
+                link_url = True
+                i += 1
+        elif c in "\n " and not open_markers and not link_text:
+            points.append((i, 0 if c == "\n" else 1, None))
+        else:
+            marker = next((m for m in MARKERS if text.startswith(m, i)), None)
+            if marker:
+                open_markers ^= {marker}
+                i += len(marker)
+                continue
+        i += 1
+    return points
+
+
+def split_markdown_v2(text: str, limit: int) -> list[str]:
+    """
+    Splits a MarkdownV2 text into parts of at most `limit` UTF-16 code units,
+    preferring newlines to spaces and never cutting an entity. Code blocks
+    are closed and reopened around a split inside them. Only a text without
+    any usable break point is cut at the limit.
+    """
+    # offsets[i] is the UTF-16 length of text[:i]
+    if utf16_len(text) == len(text):
+        offsets = range(len(text) + 1)
+    else:
+        offsets = list(
+            itertools.accumulate((2 if ord(c) > 0xFFFF else 1 for c in text), initial=0)
+        )
+    points = break_points(text)
+    parts = []
+    start, prefix, p = 0, "", 0
+    while offsets[-1] - offsets[start] + len(prefix) > limit:
+        best = {}
+        while p < len(points) and points[p][0] <= start:
+            p += 1
+        for point in itertools.islice(points, p, None):
+            position, priority, fence = point
+            closing = len(FENCE) + 1 if fence else 0
+            if offsets[position] - offsets[start] + len(prefix) + closing > limit:
+                break
+            best[priority] = point
+        if best:
+            # a newline wins unless it leaves the part less than half full
+            newline = best.get(0)
+            if newline and 2 * (offsets[newline[0]] - offsets[start]) < limit:
+                newline = None
+            position, _, fence = newline or best.get(1) or best[0]
+            part = prefix + text[start:position]
+            parts.append(f"{part}\n{FENCE}" if fence else part)
+            prefix = f"{fence}\n" if fence else ""
+            start = position + 1
+            continue
+        # no break point fits, cut at the limit outside of an escape sequence
+        end = start + 1
+        while (
+            end < len(text) and offsets[end + 1] - offsets[start] + len(prefix) <= limit
+        ):
+            end += 1
+        if text[end - 1] == "\\" and end - 1 > start:
+            end -= 1
+        parts.append(prefix + text[start:end])
+        start, prefix = end, ""
+    parts.append(prefix + text[start:])
+    return parts
+
+
+class MessagePacker:
+    """
+    Packs rendered MarkdownV2 cards into as few Telegram messages as possible,
+    in order. A card that does not fit into the current message starts a new
+    one, and only a card longer than a whole message is split.
+    """
+
+    def __init__(self, limit: int = 4096, separator: str = "\n\n"):
+        self.limit = limit
+        self.separator = separator
+        self._text = ""
+        self._keys = []
+
+    def add(self, text: str, key=None) -> list[tuple[str, list]]:
+        """
+        Adds a card.
+
+        Parameters:
+            text (str): The rendered card.
+            key: Identifies the card in the message that ends it, e.g. its word.
+
+        Returns:
+            list: The (text, keys) of the messages completed by this card, the
+                keys of the cards that end in each message.
+        """
+        joined = f"{self._text}{self.separator}{text}" if self._text else text
+        if utf16_len(joined) <= self.limit:
+            self._text = joined
+            self._keys.append(key)
+            return []
+        ready = self.flush()
+        *parts, last = split_markdown_v2(text, self.limit)
+        ready.extend((part, []) for part in parts)
+        self._text, self._keys = last, [key]
+        return ready
+
+    def flush(self) -> list[tuple[str, list]]:
+        """Returns the pending message, if any, and starts an empty one."""
+        if not self._text:
+            return []
+        message = (self._text, self._keys)
+        self._text, self._keys = "", []
+        return [message]
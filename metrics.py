@@ -0,0 +1,178 @@
+import asyncio
+import bisect
+import contextlib
+import functools
+import logging
+import time
+from typing import Callable
+
+from offload import queue_depth
+
+# upper bounds in seconds, from a dictionary lookup to a whole reminder
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+PREFIX = "vocab_bot"
+
+
+def _labels(labels: tuple[tuple[str, str], ...]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{k}="{escape(str(v))}"' for k, v in labels)
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.items())
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{{{_labels(key)}}} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # per label set: the count of each bucket plus +Inf, and the sum
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.items())
+        if key not in self._values:
+            self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self._values[key]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = _labels((*key, ("le", bound)))
+                lines.append(f"{self.name}_bucket{{{labels}}} {cumulative}")
+            lines.append(f"{self.name}_sum{{{_labels(key)}}} {total[0]}")
+            lines.append(f"{self.name}_count{{{_labels(key)}}} {cumulative}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {self.read()}",
+        ]
+
+
+stage_duration = Histogram(
+    f"{PREFIX}_stage_duration_seconds", "Duration of each pipeline stage."
+)
+stage_total = Counter(
+    f"{PREFIX}_stage_total",
+    "Finished pipeline stages by status (ok, error, cancelled).",
+)
+llm_tokens = Counter(f"{PREFIX}_llm_tokens_total", "LLM tokens used by type.")
+offload_queue_depth = Gauge(
+    f"{PREFIX}_offload_queue_depth",
+    "Calls queued or running in the CPU offload pool.",
+    queue_depth,
+)
+
+REGISTRY = [stage_duration, stage_total, llm_tokens, offload_queue_depth]
+
+
+@contextlib.contextmanager
+def track(stage: str, name: str = ""):
+    """
+    Records the duration and outcome of the enclosed code as a pipeline stage.
+
+    Parameters:
+        stage (str): The stage, e.g. eudic, mdict, llm, telegraph, tts, telegram.
+        name (str): The operation within the stage, e.g. a provider or endpoint.
+    """
+    start = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    except (asyncio.CancelledError, GeneratorExit):
+        status = "cancelled"
+        raise
+    finally:
+        stage_duration.observe(time.perf_counter() - start, stage=stage, name=name)
+        stage_total.inc(stage=stage, name=name, status=status)
+
+
+def timed(stage: str, name: str = "") -> Callable:
+    """Decorator that tracks every call of a coroutine function as a stage."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with track(stage, name or func.__name__):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_llm_usage(provider: str, usage) -> None:
+    """Counts the prompt and completion tokens of an OpenAI usage object."""
+    if usage is None:
+        return
+    llm_tokens.inc(usage.prompt_tokens or 0, provider=provider, type="prompt")
+    llm_tokens.inc(usage.completion_tokens or 0, provider=provider, type="completion")
+
+
+def render() -> str:
+    """Returns every metric in the Prometheus text exposition format."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        # drain the headers, the request has no body
+        while (await reader.readline()).strip():
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1] == "/metrics":
+            status, body = "200 OK", render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        logging.debug(f"metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int) -> asyncio.Server:
+    """Serves the metrics at http://host:port/metrics."""
+    server = await asyncio.start_server(_handle, host, port)
+    logging.info(f"metrics served at http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,63 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+from typing import Callable
+
+from config import CPU_POOL_KIND, CPU_POOL_WORKERS
+
+_executor: concurrent.futures.Executor | None = None
+
+# number of submitted calls that have not finished yet
+_pending = 0
+
+
+def get_executor() -> concurrent.futures.Executor:
+    global _executor
+    if _executor is None:
+        if CPU_POOL_KIND == "process":
+            _executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=CPU_POOL_WORKERS
+            )
+        else:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=CPU_POOL_WORKERS, thread_name_prefix="offload"
+            )
+        logging.info(f"offload pool: {CPU_POOL_KIND}, {CPU_POOL_WORKERS=}")
+    return _executor
+
+
+def queue_depth() -> int:
+    """Returns the number of calls queued or running in the pool."""
+    return _pending
+
+
+async def run_blocking(func: Callable, *args):
+    """
+    Runs a CPU-bound function in the offload pool without blocking the event loop.
+
+    Parameters:
+        func (Callable): A module-level function, so it can be sent to a process pool.
+        *args: The arguments of the function.
+
+    Returns:
+        The return value of the function.
+    """
+    global _pending
+    _pending += 1
+    if _pending > CPU_POOL_WORKERS:
+        logging.debug(f"offload queue depth: {_pending}")
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(), functools.partial(func, *args)
+        )
+    finally:
+        _pending -= 1
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
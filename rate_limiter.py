@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import datetime
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from metrics import track
+
+# priority lanes, passed to bot methods as rate_limit_args
+INTERACTIVE = 0
+BULK = 1
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Returns the seconds until a token is available, 0 if one is available now."""
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """
+    Throttles Bot API requests with a global token bucket and one token bucket
+    per chat, matched to Telegram's limits.
+
+    Waiting requests are released by a dispatcher in priority order, so
+    INTERACTIVE requests overtake BULK ones, skipping over requests whose
+    chat has no token yet. A RetryAfter error pauses all requests for the
+    requested time before the request is retried.
+    """
+
+    def __init__(
+        self,
+        overall_rate: float,
+        chat_rate: float,
+        group_rate_per_minute: float,
+        max_retries: int,
+    ):
+        self.overall_rate = overall_rate
+        self.chat_rate = chat_rate
+        self.group_rate_per_minute = group_rate_per_minute
+        self.max_retries = max_retries
+        self._overall = TokenBucket(overall_rate, overall_rate)
+        self._chats: dict[Any, TokenBucket] = {}
+        self._waiting: list[tuple[int, int, Any, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._paused_until = 0.0
+        self._dispatcher: asyncio.Task | None = None
+
+    async def initialize(self) -> None:
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+        # nothing releases the requests still waiting, fail them
+        while self._waiting:
+            *_, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_exception(RuntimeError("rate limiter shut down"))
+
+    def _chat_bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # groups, channels and @usernames share the stricter group limit
+            if isinstance(chat_id, str) or chat_id < 0:
+                rate = self.group_rate_per_minute / 60
+                bucket = TokenBucket(rate, self.group_rate_per_minute)
+            else:
+                bucket = TokenBucket(self.chat_rate, max(1.0, self.chat_rate))
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        waiting = {chat_id for _, _, chat_id, _ in self._waiting}
+        for chat_id, bucket in list(self._chats.items()):
+            if chat_id not in waiting and bucket.is_full(now):
+                del self._chats[chat_id]
+
+    async def _wait(self, timeout: float) -> None:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _wait_pause(self) -> None:
+        while (pause := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(pause)
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._wait_pause()
+            if not self._waiting:
+                await self._wait(None)
+                continue
+            now = time.monotonic()
+            overall_delay = self._overall.delay(now)
+            if overall_delay > 0:
+                await self._wait(overall_delay)
+                continue
+
+            chosen = None
+            chat_delay = float("inf")
+            for entry in sorted(self._waiting):
+                if entry[3].done():  # the waiting request was cancelled
+                    chosen = entry
+                    break
+                delay = self._chat_bucket(entry[2]).delay(now)
+                if delay == 0:
+                    chosen = entry
+                    break
+                chat_delay = min(chat_delay, delay)
+            if chosen is None:
+                await self._wait(chat_delay)
+                continue
+
+            self._waiting.remove(chosen)
+            heapq.heapify(self._waiting)
+            if not chosen[3].done():
+                self._overall.take(now)
+                self._chat_bucket(chosen[2]).take(now)
+                chosen[3].set_result(None)
+            if len(self._chats) > 1000:
+                self._prune(now)
+
+    async def _acquire(self, chat_id: Any, priority: int) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._counter), chat_id, future))
+        self._wakeup.set()
+        await future
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> Any:
+        chat_id = data.get("chat_id")
+        priority = INTERACTIVE if rate_limit_args is None else rate_limit_args
+        for attempt in range(self.max_retries + 1):
+            await self._wait_pause()
+            # requests without a chat, e.g. getUpdates, are not throttled
+            if chat_id is not None:
+                with track("telegram_throttle", endpoint):
+                    await self._acquire(chat_id, priority)
+            try:
+                with track("telegram", endpoint):
+                    return await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = exc.retry_after
+                if isinstance(retry_after, datetime.timedelta):
+                    retry_after = retry_after.total_seconds()
+                logging.warning(
+                    f"{endpoint} to {chat_id} hit the rate limit, pausing {retry_after}s"
+                )
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + retry_after + 0.1
+                )
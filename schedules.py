@@ -0,0 +1,76 @@
+import collections
+import datetime
+import json
+import logging
+import os
+import random
+
+import pytz
+
+from config import SCHEDULES_PATH, REMINDER_HOURS, REMINDER_MINUTES
+
+
+def utc_minute_of_day(tz: str, hour: int, minute: int) -> int:
+    """Converts a local wall-clock time of today to minutes since UTC midnight."""
+    local = pytz.timezone(tz).localize(
+        datetime.datetime.combine(datetime.date.today(), datetime.time(hour, minute))
+    )
+    utc = local.astimezone(pytz.utc)
+    return utc.hour * 60 + utc.minute
+
+
+class ScheduleStore:
+    """
+    Reminder schedules of every chat, persisted as JSON so they survive restarts.
+
+    A schedule is the chat's timezone and its daily (hour, minute) slots.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._schedules: dict[int, dict] = {}
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            self._schedules = {int(k): v for k, v in json.load(f).items()}
+        logging.info(f"loaded schedules of {len(self._schedules)} chats")
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._schedules, f)
+        os.replace(tmp_path, self.path)
+
+    def items(self) -> list[tuple[int, dict]]:
+        return list(self._schedules.items())
+
+    def spread_times(self, chat_id: int, tz: str) -> list[tuple[int, int]]:
+        """
+        Picks a minute for every reminder hour, preferring the UTC minutes
+        least used by the other chats so their reminders don't build at once.
+        """
+        load = collections.Counter(
+            utc_minute_of_day(schedule["tz"], h, m)
+            for other, schedule in self._schedules.items()
+            if other != chat_id
+            for h, m in schedule["times"]
+        )
+        times = []
+        for hour in REMINDER_HOURS:
+            minutes = random.sample(REMINDER_MINUTES, len(REMINDER_MINUTES))
+            minute = min(minutes, key=lambda m: load[utc_minute_of_day(tz, hour, m)])
+            times.append((hour, minute))
+        return times
+
+    def set(self, chat_id: int, tz: str, times: list[tuple[int, int]]) -> None:
+        self._schedules[chat_id] = {"tz": tz, "times": [list(t) for t in times]}
+        self.save()
+
+    def remove(self, chat_id: int) -> None:
+        if self._schedules.pop(chat_id, None) is not None:
+            self.save()
+
+
+schedule_store = ScheduleStore(SCHEDULES_PATH)
@@ -0,0 +1,161 @@
+import asyncio
+import dataclasses
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from config import SRS_STATE_PATH, SRS_SHOWN_DELAY_HOURS
+
+DAY = 24 * 3600
+
+# grades of the review buttons on the SM-2 0-5 scale
+GRADES = {"again": 1, "good": 4, "easy": 5}
+
+
+def _key(word: str) -> str:
+    return word.strip().lower()
+
+
+@dataclasses.dataclass
+class ReviewState:
+    ease: float = 2.5
+    interval: float = 0.0  # days
+    repetitions: int = 0
+    due: float = 0.0  # unix timestamp
+    rank: float = dataclasses.field(default_factory=random.random)  # tie-breaker
+
+
+class ReviewScheduler:
+    """
+    SM-2 spaced-repetition scheduler with per-word state persisted as JSON.
+
+    A heap keyed by due time holds every word; entries are invalidated lazily,
+    so choosing the k most-due words costs O(k log n).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._states: dict[str, ReviewState] = {}
+        self._heap: list[tuple[float, float, str]] = []
+        self._write_lock = threading.Lock()
+
+    def load(self) -> None:
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                self._states = {
+                    word: ReviewState(**state) for word, state in json.load(f).items()
+                }
+            logging.info(f"loaded review state of {len(self._states)} words")
+        self._rebuild_heap()
+
+    def _write(self, states: dict) -> None:
+        with self._write_lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(states, f)
+            os.replace(tmp_path, self.path)
+
+    async def save(self) -> None:
+        states = {word: dataclasses.asdict(s) for word, s in self._states.items()}
+        await asyncio.to_thread(self._write, states)
+
+    def _schedule(self, word: str, state: ReviewState) -> None:
+        self._states[word] = state
+        heapq.heappush(self._heap, (state.due, state.rank, word))
+
+    def add(self, words: list[str]) -> None:
+        """Starts tracking words, new words are due immediately."""
+        for word in map(_key, words):
+            if word not in self._states:
+                self._schedule(word, ReviewState())
+
+    def remove(self, words: list[str]) -> None:
+        """Stops tracking words, their heap entries are dropped lazily."""
+        for word in map(_key, words):
+            self._states.pop(word, None)
+
+    def sync(self, words: list[str]) -> None:
+        """Aligns the tracked words with the full study list."""
+        keys = set(map(_key, words))
+        self.remove([word for word in self._states if word not in keys])
+        self.add(list(keys))
+        # rebuild once stale entries dominate the heap
+        if len(self._heap) > 2 * len(self._states):
+            self._rebuild_heap()
+
+    def _rebuild_heap(self) -> None:
+        self._heap = [(s.due, s.rank, word) for word, s in self._states.items()]
+        heapq.heapify(self._heap)
+
+    def select(self, k: int) -> list[str]:
+        """
+        Pops the k most-due words and postpones them by SRS_SHOWN_DELAY_HOURS,
+        so a word that is not reviewed is not shown again right away.
+
+        Parameters:
+            k (int): The number of words to select.
+
+        Returns:
+            list: The lowercased words, most overdue first.
+        """
+        chosen = []
+        while self._heap and len(chosen) < k:
+            due, rank, word = heapq.heappop(self._heap)
+            state = self._states.get(word)
+            if state is None or (state.due, state.rank) != (due, rank):
+                continue  # removed or rescheduled since it was pushed
+            chosen.append(word)
+        now = time.time()
+        for word in chosen:
+            state = self._states[word]
+            self._schedule(
+                word,
+                dataclasses.replace(
+                    state, due=now + SRS_SHOWN_DELAY_HOURS * 3600, rank=random.random()
+                ),
+            )
+        logging.info(f"{len(self._states)=}, {k=}, {chosen=}")
+        return chosen
+
+    def review(self, word: str, grade: str) -> ReviewState | None:
+        """
+        Applies a review to a word with the SM-2 algorithm.
+
+        Parameters:
+            word (str): The reviewed word.
+            grade (str): One of the keys of GRADES.
+
+        Returns:
+            ReviewState | None: The new state, None for an unknown word.
+        """
+        word = _key(word)
+        state = self._states.get(word)
+        if state is None:
+            return None
+        quality = GRADES[grade]
+        if quality < 3:
+            repetitions, interval = 0, 1.0
+        elif state.repetitions == 0:
+            repetitions, interval = 1, 1.0
+        elif state.repetitions == 1:
+            repetitions, interval = 2, 6.0
+        else:
+            repetitions, interval = state.repetitions + 1, state.interval * state.ease
+        ease = max(
+            1.3, state.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+        )
+        new_state = ReviewState(
+            ease=ease,
+            interval=interval,
+            repetitions=repetitions,
+            due=time.time() + interval * DAY,
+        )
+        self._schedule(word, new_state)
+        return new_state
+
+
+review_scheduler = ReviewScheduler(SRS_STATE_PATH)
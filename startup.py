@@ -0,0 +1,46 @@
+import contextlib
+import logging
+import os
+import time
+
+
+def process_age() -> float | None:
+    """Returns the seconds since the process started, None where /proc is missing."""
+    try:
+        with open("/proc/self/stat", encoding="utf-8") as f:
+            stat = f.read()
+        with open("/proc/uptime", encoding="utf-8") as f:
+            uptime = float(f.read().split()[0])
+    except OSError:
+        return None
+    # the command name may contain spaces, the fields are counted after it
+    start_ticks = int(stat.rsplit(")", 1)[1].split()[19])
+    return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+class StartupReport:
+    """Durations of the startup phases, logged once the bot takes updates."""
+
+    def __init__(self, title: str):
+        self.title = title
+        self.phases: list[tuple[str, float]] = []
+
+    def record(self, name: str, seconds: float | None) -> None:
+        if seconds is not None:
+            self.phases.append((name, seconds))
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def log(self) -> None:
+        phases = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.phases)
+        logging.info(f"{self.title}: {phases}")
+
+
+startup_report = StartupReport("startup")
+warm_up_report = StartupReport("warm-up")
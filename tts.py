@@ -5,10 +5,12 @@ Basic example of edge_tts usage.
 """
 
 import asyncio
+import logging
+import re
+import time
 
-import edge_tts
-
-from config import VOICE
+from config import VOICE, TTS_CHUNK_CHARS, TTS_CHUNK_CONCURRENCY
+from metrics import timed
 
 TEXT = """
     Fashion and Food: A Lean and Healthy Lifestyle
@@ -18,11 +20,87 @@ The world of fashion and food is filled with deep-pocketed designers and restaur
 OUTPUT_FILE = "test.mp3"
 
 
-async def gen_tts_audio(text: str, filename: str) -> None:
-    """Main function"""
+@timed("tts", "request")
+async def gen_tts_audio(text: str) -> bytes:
+    """Synthesizes text and returns the MP3 audio without touching the filesystem"""
+    import edge_tts
+
     communicate = edge_tts.Communicate(text, VOICE)
-    await communicate.save(filename)
+    audio = bytearray()
+    async for chunk in communicate.stream():
+        if chunk["type"] == "audio":
+            audio.extend(chunk["data"])
+    return bytes(audio)
+
+
+def split_text_into_chunks(text: str, max_chars: int) -> list[str]:
+    """
+    Splits text into chunks of at most max_chars, breaking at paragraph
+    boundaries first, then at sentence boundaries, then at spaces.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            pieces.append((paragraph, "\n\n"))
+            continue
+        for sentence in re.split(r"(?<=[.!?。！？])\s+", paragraph):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append((sentence[:cut], " "))
+                sentence = sentence[cut:].lstrip()
+            pieces.append((sentence, " "))
+        pieces[-1] = (pieces[-1][0], "\n\n")
+
+    chunks = []
+    current = ""
+    for piece, separator in pieces:
+        if not piece:
+            continue
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current.strip())
+            current = ""
+        current += piece + separator
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+@timed("tts", "synthesize")
+async def gen_tts_audio_chunked(
+    text: str,
+    max_chars: int = TTS_CHUNK_CHARS,
+    concurrency: int = TTS_CHUNK_CONCURRENCY,
+) -> bytes:
+    """
+    Synthesizes long text as concurrently generated chunks and joins the MP3
+    segments in order, falling back to a single request for short text.
+    """
+    chunks = split_text_into_chunks(text, max_chars) if max_chars > 0 else [text]
+    if len(chunks) <= 1:
+        return await gen_tts_audio(text)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def synthesize(i: int, chunk: str) -> bytes:
+        async with semaphore:
+            start = time.perf_counter()
+            audio = await gen_tts_audio(chunk)
+            logging.info(
+                f"tts chunk {i}/{len(chunks)}: {len(chunk)} chars, "
+                f"{time.perf_counter() - start:.2f}s"
+            )
+            return audio
+
+    start = time.perf_counter()
+    segments = await asyncio.gather(
+        *(synthesize(i, chunk) for i, chunk in enumerate(chunks, 1))
+    )
+    logging.info(f"tts {len(chunks)} chunks: {time.perf_counter() - start:.2f}s")
+    return b"".join(segments)
 
 
 if __name__ == "__main__":
-    asyncio.run(gen_tts_audio(TEXT, OUTPUT_FILE))
+    with open(OUTPUT_FILE, "wb") as f:
+        f.write(asyncio.run(gen_tts_audio(TEXT)))
@@ -0,0 +1,131 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+from config import TTS_CACHE_PATH, TTS_CACHE_MAX_BYTES
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized speech backed by SQLite.
+
+    Entries are keyed by voice and text hash and keep the MP3 bytes and,
+    once the audio was uploaded, the Telegram file_id to re-send it with.
+    The least recently used audio is evicted once the cache holds more than
+    `max_bytes`, keeping its file_id. The database is opened on first use.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # called with the lock held
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS tts_audio (
+                        key TEXT PRIMARY KEY,
+                        audio BLOB,
+                        file_id TEXT,
+                        created_at REAL NOT NULL
+                    )
+                    """
+                )
+                columns = [
+                    row[1] for row in conn.execute("PRAGMA table_info(tts_audio)")
+                ]
+                if "accessed_at" not in columns:
+                    conn.execute("ALTER TABLE tts_audio ADD COLUMN accessed_at REAL")
+                    conn.execute("UPDATE tts_audio SET accessed_at = created_at")
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS tts_audio_accessed_at "
+                    "ON tts_audio (accessed_at)"
+                )
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(voice: str, text: str) -> str:
+        text_hash = hashlib.sha256(text.encode()).hexdigest()
+        return f"{voice}:{text_hash}"
+
+    def get(self, key: str) -> tuple[str | None, bytes | None]:
+        """
+        Looks up cached speech.
+
+        Parameters:
+            key (str): The key built by make_key.
+
+        Returns:
+            tuple: The Telegram file_id and the MP3 bytes, each None when unknown.
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT file_id, audio FROM tts_audio WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                with conn:
+                    conn.execute(
+                        "UPDATE tts_audio SET accessed_at = ? WHERE key = ?",
+                        (time.time(), key),
+                    )
+        if row is None:
+            self.misses += 1
+            return None, None
+        self.hits += 1
+        return row[0], row[1]
+
+    def put_audio(self, key: str, audio: bytes) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO tts_audio (key, audio, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET audio = excluded.audio, "
+                    "accessed_at = excluded.accessed_at",
+                    (key, audio, now, now),
+                )
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        (size,) = conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(audio)), 0) FROM tts_audio"
+        ).fetchone()
+        if size <= self.max_bytes:
+            return
+        # drop the least recently used audio, the newest one is always kept;
+        # the file_id stays, Telegram re-sends it without an upload
+        rows = conn.execute(
+            "SELECT key, LENGTH(audio), file_id FROM tts_audio "
+            "WHERE audio IS NOT NULL ORDER BY accessed_at"
+        ).fetchall()
+        for key, length, file_id in rows[:-1]:
+            if size <= self.max_bytes:
+                break
+            if file_id:
+                conn.execute("UPDATE tts_audio SET audio = NULL WHERE key = ?", (key,))
+            else:
+                conn.execute("DELETE FROM tts_audio WHERE key = ?", (key,))
+            size -= length
+
+    def put_file_id(self, key: str, file_id: str | None) -> None:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE tts_audio SET file_id = ? WHERE key = ?", (file_id, key)
+                )
+
+
+tts_cache = TTSCache(TTS_CACHE_PATH, TTS_CACHE_MAX_BYTES) if TTS_CACHE_PATH else None
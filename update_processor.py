@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class UserLaneUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates concurrently, at most `max_concurrent_updates` at a time,
+    while the updates of one user run one after another in arrival order.
+
+    A user's update waits for its lane before it takes one of the processor's
+    slots, so a user with a queue of slow requests holds at most one slot and
+    never delays the other users. The semaphore of the base class only bounds
+    the updates in flight, those waiting in a lane included, by
+    `max_pending_updates`.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = 1024):
+        super().__init__(max(max_concurrent_updates, max_pending_updates))
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # per lane key: its lock and the number of updates holding or awaiting it
+        self._lanes: dict[int, tuple[asyncio.Lock, list[int]]] = {}
+
+    @staticmethod
+    def lane_key(update: object) -> int | None:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(
+        self, update: object, coroutine: Awaitable[Any]
+    ) -> None:
+        key = self.lane_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+        lock, users = self._lanes.setdefault(key, (asyncio.Lock(), [0]))
+        users[0] += 1
+        try:
+            # asyncio.Lock wakes its waiters in FIFO order
+            async with lock, self._slots:
+                await coroutine
+        finally:
+            users[0] -= 1
+            if users[0] == 0:
+                del self._lanes[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+
+from config import VOCABULARY_STORE_PATH, VOCABULARY_SYNC_PAGE_SIZE
+from eudic import list_eudic_vocabulary
+
+
+def _key(word: str) -> str:
+    return word.strip().lower()
+
+
+class VocabularyStore:
+    """
+    Local mirror of the Eudic study list, persisted as a JSON file.
+
+    Words added or removed through the bot are applied locally as soon as
+    Eudic accepts them, and `reconcile` refreshes the mirror with paged fetches.
+    The study list API has no change feed or modification times, so every
+    reconcile fetches all pages; it runs in the background and lookups are
+    served from the mirror meanwhile.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._words: dict[str, dict] = {}
+        self._journal: list[tuple[str, list[str]]] | None = None
+        self._write_lock = threading.Lock()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            self._words = {_key(w["word"]): w for w in json.load(f)}
+        logging.info(f"loaded {len(self._words)} words from {self.path}")
+
+    def _write(self, words: list[dict]) -> None:
+        with self._write_lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(words, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    async def save(self) -> None:
+        await asyncio.to_thread(self._write, list(self._words.values()))
+
+    def words(self) -> list[dict]:
+        """Returns the study list entries in Eudic order."""
+        return list(self._words.values())
+
+    def get(self, word: str) -> dict | None:
+        return self._words.get(_key(word))
+
+    def _apply(self, words: dict[str, dict], op: str, items: list[str]) -> None:
+        for word in items:
+            if op == "add":
+                words.setdefault(_key(word), {"word": word.strip(), "exp": ""})
+            else:
+                words.pop(_key(word), None)
+
+    async def add(self, words: list[str]) -> None:
+        """Records words that were added to Eudic."""
+        await self._update("add", words)
+
+    async def remove(self, words: list[str]) -> None:
+        """Records words that were removed from Eudic."""
+        await self._update("remove", words)
+
+    async def _update(self, op: str, words: list[str]) -> None:
+        self._apply(self._words, op, words)
+        # replay the change on top of a reconcile that is still fetching
+        if self._journal is not None:
+            self._journal.append((op, words))
+        await self.save()
+
+    async def reconcile(self, page_size: int = VOCABULARY_SYNC_PAGE_SIZE) -> None:
+        """Replaces the mirror with the current study list, fetched page by page."""
+        if self._journal is not None:
+            logging.info("vocabulary reconcile already running")
+            return
+        self._journal = []
+        try:
+            fetched = {}
+            page = 0
+            while True:
+                data = await list_eudic_vocabulary(page, page_size)
+                for w in data:
+                    fetched[_key(w["word"])] = w
+                if len(data) < page_size:
+                    break
+                page += 1
+            for op, words in self._journal:
+                self._apply(fetched, op, words)
+        finally:
+            self._journal = None
+        logging.info(f"vocabulary reconciled: {len(self._words)} -> {len(fetched)}")
+        self._words = fetched
+        await self.save()
+
+
+vocabulary_store = VocabularyStore(VOCABULARY_STORE_PATH)